@@ -0,0 +1,74 @@
+"""Per-request overhead of the app's pure ASGI middlewares.
+
+Calls each middleware around a bare ASGI app and reports the microseconds it adds per
+request as JSON. Timings depend on the machine, so they are checked here rather than in the
+unit tests; the exit status is 1 when an overhead is above its limit.
+
+    python -m backend.benchmarks.middleware --requests 20000 --max-metrics-us 50 --max-session-api-us 10
+"""
+import asyncio
+import sys
+import time
+from typing import List, Optional, Sequence
+from backend.benchmarks.harness import run_cli
+from backend.fastapi.core.metrics import RequestMetrics
+from backend.fastapi.core.middleware import DocProtectMiddleware, MetricsMiddleware, ScopedSessionMiddleware
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def call_asgi(asgi_app, times: int, path: str = "/") -> float:
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start_time = time.perf_counter()
+    for _ in range(times):
+        await asgi_app(dict(scope), receive, send)
+    return time.perf_counter() - start_time
+
+async def run_middleware_benchmark(requests: int = 20000) -> dict:
+    # The same stack setup_session and add_doc_protect build, without the rest of the app
+    protected_app = ScopedSessionMiddleware(DocProtectMiddleware(bare_app), secret_key="benchmark", max_age=1800)
+
+    bare_time = await call_asgi(bare_app, requests)
+    timings = {
+        "metrics": await call_asgi(MetricsMiddleware(bare_app, RequestMetrics()), requests),
+        "session_api": await call_asgi(protected_app, requests, "/api/v1/messages/"),
+        "session_docs": await call_asgi(protected_app, requests, "/docs"),
+    }
+    return {
+        "requests": requests,
+        "overhead_us": {name: round((elapsed - bare_time) / requests * 1e6, 3) for name, elapsed in timings.items()},
+    }
+
+def check_limits(result: dict, limits: dict) -> List[str]:
+    return [
+        f"{name}: {result['overhead_us'][name]} us > limit {limit} us"
+        for name, limit in limits.items()
+        if result["overhead_us"][name] > limit
+    ]
+
+def add_arguments(parser):
+    parser.add_argument("--requests", type=int, default=20000, help="Requests to time per middleware")
+    # Keep the instrumentation well below a typical request's cost
+    parser.add_argument("--max-metrics-us", type=float, default=50.0, help="Limit for MetricsMiddleware")
+    # API requests only pay for two path lookups
+    parser.add_argument("--max-session-api-us", type=float, default=10.0,
+                        help="Limit for the session and doc-protect middlewares on API requests")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    return run_cli(
+        __doc__, add_arguments, lambda args: asyncio.run(run_middleware_benchmark(args.requests)), argv,
+        check=lambda args, result: check_limits(
+            result, {"metrics": args.max_metrics_us, "session_api": args.max_session_api_us}
+        ),
+    )
+
+if __name__ == "__main__":
+    sys.exit(main())
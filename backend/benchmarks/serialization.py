@@ -0,0 +1,66 @@
+"""CPU time of GET /api/v1/messages/ with FAST_JSON_RESPONSES off and on.
+
+Lists pages of messages through the in-process app and reports the process CPU time spent
+per 1000 listed messages on each path as JSON. Responses are requested uncompressed, so only
+serialization is measured. The exit status is 1 when the fast JSON path is not the cheaper one.
+
+    python -m backend.benchmarks.serialization --limit 1000 --requests 20
+"""
+import asyncio
+import sys
+import time
+from typing import List, Optional, Sequence
+from httpx import ASGITransport, AsyncClient
+from backend.benchmarks.harness import API_PREFIX, run_cli, seed_messages
+
+async def cpu_ms_per_thousand(client: AsyncClient, limit: int, requests: int) -> float:
+    # process_time also counts the threadpool workers that run the sync route
+    start = time.process_time()
+    for _ in range(requests):
+        response = await client.get(f"{API_PREFIX}/", params={"limit": limit})
+        response.raise_for_status()
+    return round((time.process_time() - start) * 1000 / requests / (limit / 1000), 3)
+
+async def run_serialization_benchmark(app, limit: int = 1000, requests: int = 20) -> dict:
+    from backend.fastapi.core.init_settings import global_settings
+
+    fast_json = global_settings.FAST_JSON_RESPONSES
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://benchmark", headers={"Accept-Encoding": "identity"}
+    ) as client:
+        await seed_messages(client, limit)
+        try:
+            global_settings.FAST_JSON_RESPONSES = False
+            schema_cpu_ms = await cpu_ms_per_thousand(client, limit, requests)
+            global_settings.FAST_JSON_RESPONSES = True
+            fast_cpu_ms = await cpu_ms_per_thousand(client, limit, requests)
+        finally:
+            global_settings.FAST_JSON_RESPONSES = fast_json
+    return {
+        "limit": limit,
+        "requests": requests,
+        "cpu_ms_per_1000_messages": {"schema": schema_cpu_ms, "fast_json": fast_cpu_ms},
+    }
+
+def add_arguments(parser):
+    parser.add_argument("--limit", type=int, default=1000, help="Messages per listed page")
+    parser.add_argument("--requests", type=int, default=20, help="Pages to list on each path")
+
+def run(args) -> dict:
+    from backend.fastapi.dependencies.database import init_db
+    from backend.fastapi.main import app
+
+    init_db()
+    return asyncio.run(run_serialization_benchmark(app, args.limit, args.requests))
+
+def check_fast_json(args, result: dict) -> List[str]:
+    cpu_ms = result["cpu_ms_per_1000_messages"]
+    if cpu_ms["fast_json"] >= cpu_ms["schema"]:
+        return [f"fast JSON path {cpu_ms['fast_json']} ms >= schema path {cpu_ms['schema']} ms"]
+    return []
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    return run_cli(__doc__, add_arguments, run, argv, check=check_fast_json)
+
+if __name__ == "__main__":
+    sys.exit(main())
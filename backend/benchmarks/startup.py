@@ -0,0 +1,101 @@
+"""Import-time and startup profile of the API.
+
+Each run starts a fresh interpreter that imports backend.fastapi.main, builds the app with
+create_app() and runs its lifespan startup. Reports the median time of each phase, and
+the slowest imports from `python -X importtime`, as JSON.
+
+    python -m backend.benchmarks.startup --runs 5 --output startup.json
+    python -m backend.benchmarks.startup --baseline startup.json --tolerance 0.2
+
+With --baseline the exit status is 1 when any phase got slower by more than --tolerance.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional, Sequence
+from backend.benchmarks.harness import run_cli
+
+PHASES = ("import_ms", "create_app_ms", "startup_ms", "total_ms")
+
+# Runs in the child interpreter; prints one JSON line with the phase timings
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from backend.fastapi.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app):
+    started = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "startup_ms": (started - created) * 1000,
+    "total_ms": (started - start) * 1000,
+}))
+"""
+
+def run_child(args: List[str], env: Dict[str, str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+def profile_startup(env: Dict[str, str]) -> dict:
+    return json.loads(run_child(["-c", STARTUP_SCRIPT], env).stdout.strip().splitlines()[-1])
+
+def parse_importtime(stderr: str) -> List[dict]:
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append({
+            "module": module.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return imports
+
+def profile_imports(env: Dict[str, str], top: int) -> List[dict]:
+    script = "from backend.fastapi.main import create_app; create_app()"
+    imports = parse_importtime(run_child(["-X", "importtime", "-c", script], env).stderr)
+    return sorted(imports, key=lambda entry: entry["self_ms"], reverse=True)[:top]
+
+def run_profile(runs: int, top: int, database_url: Optional[str] = None) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "ENV_MODE": "dev",
+            "DEV_DB_URL": database_url or f"sqlite:///{os.path.join(directory, 'startup.db')}",
+        }
+        samples = [profile_startup(env) for _ in range(runs)]
+        slowest_imports = profile_imports(env, top)
+    return {
+        "runs": runs,
+        **{phase: round(statistics.median(sample[phase] for sample in samples), 3) for phase in PHASES},
+        "slowest_imports": slowest_imports,
+    }
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for phase in PHASES:
+        if phase in baseline and result[phase] > baseline[phase] * (1 + tolerance):
+            regressions.append(f"{phase}: {result[phase]} ms > baseline {baseline[phase]} ms")
+    return regressions
+
+def add_arguments(parser):
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--database", help="Database URL for the startup run (default: a temporary SQLite file)")
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    return run_cli(
+        __doc__, add_arguments, lambda args: run_profile(args.runs, args.top, args.database), argv,
+        compare=compare_to_baseline,
+    )
+
+if __name__ == "__main__":
+    sys.exit(main())
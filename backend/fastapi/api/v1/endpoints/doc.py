@@ -2,16 +2,15 @@ import os
 from fastapi import Form, Request
 from fastapi import APIRouter
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from backend.fastapi.core.templates import get_templates
 from backend.security.authentication import authenticate_user
 
 router = APIRouter()
-templates = Jinja2Templates(directory="frontend/login/templates")
 
 # Endpoint for login form
 @router.get("/login", response_class=HTMLResponse)
 async def login_form(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse("login.html", {"request": request})
 
 @router.post("/login", response_class=HTMLResponse)
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
@@ -20,7 +19,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
         return RedirectResponse(url="/docs", status_code=303)
     else:
         message = "Invalid credentials"
-        return templates.TemplateResponse("login.html", {"request": request, "message": message})
+        return get_templates().TemplateResponse("login.html", {"request": request, "message": message})
     
 @router.get("/logout", response_class=HTMLResponse)
 async def logout(request: Request):
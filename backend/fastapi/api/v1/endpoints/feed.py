@@ -0,0 +1,52 @@
+import asyncio
+import anyio
+from fastapi import APIRouter, Depends, WebSocket
+from fastapi.responses import StreamingResponse
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.core.serialization import dumps
+from backend.fastapi.dependencies.events import message_events
+from backend.fastapi.dependencies.rate_limiter import RateLimiter, check_ip_rate_limit, check_websocket_rate_limit
+
+# Live create, update and delete events, so clients can stop polling GET /messages/.
+# Included ahead of the message router, whose /messages/{message_id} would match "stream".
+router = APIRouter()
+
+def sse_event(event: dict) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+async def sse_stream():
+    async with message_events.subscribe() as subscription:
+        # Flushes the headers; the subscription is live once the client sees this
+        yield b": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.MESSAGE_EVENTS_PING_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield sse_event(event)
+
+@router.get("/messages/stream", response_class=StreamingResponse, dependencies=[Depends(check_ip_rate_limit), Depends(RateLimiter())])
+async def stream_messages():
+    # Starlette stops the stream, and so the subscription, when the client disconnects
+    return StreamingResponse(
+        sse_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/messages/ws", dependencies=[Depends(check_websocket_rate_limit)])
+async def message_feed(websocket: WebSocket):
+    # Subscribe before accepting, so nothing published after the handshake is missed
+    async with message_events.subscribe() as subscription:
+        await websocket.accept()
+        async with anyio.create_task_group() as tasks:
+            async def forward():
+                while True:
+                    await websocket.send_text(dumps(await subscription.get()).decode())
+
+            tasks.start_soon(forward)
+            # Clients only listen; wait for the disconnect, then stop forwarding
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+            tasks.cancel_scope.cancel()
@@ -1,31 +1,212 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import status, APIRouter, Depends
+from fastapi import status, APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from backend.fastapi.core.conditional import (
+    etag_matches,
+    if_match_versions,
+    list_etag,
+    message_etag,
+    not_modified,
+    set_validators,
+)
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.core.serialization import FastJSONResponse, dump_rows
 from backend.fastapi.crud import MessageService
-from backend.fastapi.schemas import MessageBase, MessageCreate, MessageSchema
+from backend.fastapi.crud.message import TRANSFER_MEDIA_TYPES, TransferFormat, import_records
+from backend.fastapi.crud.pagination import next_cursor
+from backend.fastapi.dependencies.rate_limiter import RateLimiter, check_ip_rate_limit
+from backend.fastapi.schemas import MessageBase, MessageCreate, MessageSchema, MessageBulkResponse, MessageBatchGetResponse, MessageImportResponse
 
-router = APIRouter()
+# Every message route is rate limited per client and per route
+RATE_LIMITS = [Depends(check_ip_rate_limit), Depends(RateLimiter())]
+router = APIRouter(dependencies=RATE_LIMITS)
 
-@router.post("/messages/", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
-def create_message(message_data: MessageCreate, service: MessageService = Depends()):
-    return service.create_message(message_data)
+# Unsuffixed routes for each engine. setup_routers includes the DEFAULT_DB_ENGINE one after
+# `router`, so that static paths such as /messages/async win over /messages/{message_id}.
+default_routers = {engine: APIRouter(dependencies=RATE_LIMITS) for engine in ("sync", "async")}
 
-@router.post("/messages/async", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
-async def create_message_async(message_data: MessageCreate, service: MessageService = Depends()):
-    return await service.create_message_async(message_data)
+def message_route(method: str, path: str, engine: str, **kwargs):
+    # Register the endpoint at `<path>/<engine>`, and at `<path>` on the engine's default router
+    def decorator(endpoint):
+        router.add_api_route(f"{path.rstrip('/')}/{engine}", endpoint, methods=[method], **kwargs)
+        default_routers[engine].add_api_route(path, endpoint, methods=[method], **kwargs)
+        return endpoint
+    return decorator
 
-@router.get("/messages/", response_model=List[MessageSchema], status_code=status.HTTP_200_OK)
-def get_messages(skip: int = 0, limit: int = 30, service: MessageService = Depends()):
-    return service.get_messages(skip, limit)
+def set_next_cursor(response: Response, messages: list, limit: int):
+    cursor = next_cursor(messages, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
 
-@router.get("/messages/{message_id}", response_model=MessageSchema, status_code=status.HTTP_200_OK)
-def get_message(message_id: UUID, service: MessageService = Depends()):
-    return service.get_message(message_id)
+def set_total_count(response: Response, total: Optional[int]):
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
 
-@router.put("/messages/{message_id}", response_model=MessageSchema, status_code=status.HTTP_200_OK)
-def update_message(message_id: UUID, message_data: MessageBase, service: MessageService = Depends()):
-    return service.update_message(message_id, message_data)
+def messages_response(response: Response, messages: list, limit: int, if_none_match: Optional[str], total: Optional[int] = None):
+    # A page's ETag covers the id and version of every message on it
+    etag = list_etag(messages)
+    last_modified = max((message.updated_at for message in messages), default=None)
+    if etag_matches(if_none_match, etag):
+        not_modified_response = not_modified(etag, last_modified)
+        set_total_count(not_modified_response, total)
+        return not_modified_response
+    if settings.FAST_JSON_RESPONSES:
+        # Returned directly, so FastAPI neither re-validates against response_model nor re-encodes
+        fast_response = FastJSONResponse(dump_rows(messages))
+        set_validators(fast_response, etag, last_modified)
+        set_next_cursor(fast_response, messages, limit)
+        set_total_count(fast_response, total)
+        return fast_response
+    set_validators(response, etag, last_modified)
+    set_next_cursor(response, messages, limit)
+    set_total_count(response, total)
+    return messages
 
-@router.delete("/messages/{message_id}", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+def export_response(stream, fmt: TransferFormat) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type=TRANSFER_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="messages.{fmt}"'},
+    )
+
+# The import body is read as a stream, so document it by hand. CSV needs a `content` column.
+IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {media_type: {"schema": {"type": "string"}} for media_type in TRANSFER_MEDIA_TYPES.values()},
+    }
+}
+
+def check_bulk_size(messages_data: List[MessageCreate]):
+    if len(messages_data) > settings.BULK_CREATE_MAX_MESSAGES:
+        raise HTTPException(status_code=422, detail=f"At most {settings.BULK_CREATE_MAX_MESSAGES} messages per request")
+
+def check_batch_size(message_ids: List[UUID]):
+    if len(message_ids) > settings.BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {settings.BATCH_GET_MAX_IDS} ids per request")
+
+def batch_get_response(message_ids: List[UUID], found: dict) -> dict:
+    return {
+        "messages": [found.get(message_id) for message_id in message_ids],
+        "missing": [message_id for message_id in dict.fromkeys(message_ids) if message_id not in found],
+    }
+
+def set_message_validators(response: Response, message):
+    set_validators(response, message_etag(message.version), message.updated_at)
+    return message
+
+# Synchronous endpoints, run in the threadpool with a sync Session
+@message_route("POST", "/messages/", "sync", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
+def create_message(response: Response, message_data: MessageCreate, service: MessageService = Depends()):
+    return set_message_validators(response, service.create_message(message_data))
+
+@message_route("POST", "/messages/bulk", "sync", response_model=MessageBulkResponse, status_code=status.HTTP_201_CREATED)
+def create_messages_bulk(messages_data: List[MessageCreate], service: MessageService = Depends()):
+    check_bulk_size(messages_data)
+    return {"ids": service.create_messages_bulk(messages_data)}
+
+@message_route("POST", "/messages/batch-get", "sync", response_model=MessageBatchGetResponse, status_code=status.HTTP_200_OK)
+def batch_get_messages(message_ids: List[UUID], service: MessageService = Depends()):
+    check_batch_size(message_ids)
+    return batch_get_response(message_ids, service.get_messages_by_ids(message_ids))
+
+@message_route("GET", "/messages/", "sync", response_model=List[MessageSchema], status_code=status.HTTP_200_OK)
+def get_messages(response: Response, skip: int = 0, limit: int = 30, cursor: Optional[str] = None,
+                 count: bool = False, exact: bool = False,
+                 if_none_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    # count=true adds X-Total-Count, an estimate unless exact=true
+    total = service.count_messages(exact) if count or exact else None
+    if settings.FAST_JSON_RESPONSES:
+        messages = service.get_message_rows(skip, limit, cursor)
+    else:
+        messages = service.get_messages(skip, limit, cursor)
+    return messages_response(response, messages, limit, if_none_match, total)
+
+# Registered before /messages/{message_id}, which would otherwise match "search" and "export"
+@message_route("GET", "/messages/search", "sync", response_model=List[MessageSchema], status_code=status.HTTP_200_OK)
+def search_messages(q: str = Query(..., min_length=1), skip: int = 0, limit: int = 30, service: MessageService = Depends()):
+    rows = service.search_messages(q, skip, limit)
+    return FastJSONResponse(dump_rows(rows)) if settings.FAST_JSON_RESPONSES else rows
+
+@message_route("GET", "/messages/export", "sync", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+def export_messages(fmt: TransferFormat = Query("ndjson", alias="format"), service: MessageService = Depends()):
+    return export_response(service.export_messages(fmt), fmt)
+
+@message_route("POST", "/messages/import", "sync", response_model=MessageImportResponse, status_code=status.HTTP_201_CREATED, openapi_extra=IMPORT_REQUEST_BODY)
+async def import_messages(request: Request, fmt: TransferFormat = Query("ndjson", alias="format"), service: MessageService = Depends()):
+    # Async so the body is parsed as it arrives; the inserts still run on the sync engine
+    return {"imported": await service.import_messages(import_records(request.stream(), fmt))}
+
+@message_route("GET", "/messages/{message_id}", "sync", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+def get_message(message_id: UUID, response: Response, if_none_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    if if_none_match:
+        # Compare versions before loading the message; the body is only sent when it changed
+        current = service.get_message_version(message_id)
+        if etag_matches(if_none_match, message_etag(current.version)):
+            return not_modified(message_etag(current.version), current.updated_at)
+    return set_message_validators(response, service.get_message(message_id))
+
+@message_route("PUT", "/messages/{message_id}", "sync", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+def update_message(message_id: UUID, message_data: MessageBase, response: Response, if_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    # With If-Match, a PUT based on an outdated version fails with 412 instead of overwriting
+    return set_message_validators(response, service.update_message(message_id, message_data, if_match_versions(if_match)))
+
+@message_route("DELETE", "/messages/{message_id}", "sync", response_model=MessageSchema, status_code=status.HTTP_200_OK)
 def delete_message(message_id: UUID, service: MessageService = Depends()):
-    return service.delete_message(message_id)
\ No newline at end of file
+    return service.delete_message(message_id)
+
+# Asynchronous endpoints, run on the event loop with an AsyncSession
+@message_route("POST", "/messages/", "async", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
+async def create_message_async(response: Response, message_data: MessageCreate, service: MessageService = Depends()):
+    return set_message_validators(response, await service.create_message_async(message_data))
+
+@message_route("POST", "/messages/bulk", "async", response_model=MessageBulkResponse, status_code=status.HTTP_201_CREATED)
+async def create_messages_bulk_async(messages_data: List[MessageCreate], service: MessageService = Depends()):
+    check_bulk_size(messages_data)
+    return {"ids": await service.create_messages_bulk_async(messages_data)}
+
+@message_route("POST", "/messages/batch-get", "async", response_model=MessageBatchGetResponse, status_code=status.HTTP_200_OK)
+async def batch_get_messages_async(message_ids: List[UUID], service: MessageService = Depends()):
+    check_batch_size(message_ids)
+    return batch_get_response(message_ids, await service.get_messages_by_ids_async(message_ids))
+
+@message_route("GET", "/messages/", "async", response_model=List[MessageSchema], status_code=status.HTTP_200_OK)
+async def get_messages_async(response: Response, skip: int = 0, limit: int = 30, cursor: Optional[str] = None,
+                             count: bool = False, exact: bool = False,
+                             if_none_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    total = await service.count_messages_async(exact) if count or exact else None
+    if settings.FAST_JSON_RESPONSES:
+        messages = await service.get_message_rows_async(skip, limit, cursor)
+    else:
+        messages = await service.get_messages_async(skip, limit, cursor)
+    return messages_response(response, messages, limit, if_none_match, total)
+
+@message_route("GET", "/messages/search", "async", response_model=List[MessageSchema], status_code=status.HTTP_200_OK)
+async def search_messages_async(q: str = Query(..., min_length=1), skip: int = 0, limit: int = 30, service: MessageService = Depends()):
+    rows = await service.search_messages_async(q, skip, limit)
+    return FastJSONResponse(dump_rows(rows)) if settings.FAST_JSON_RESPONSES else rows
+
+@message_route("GET", "/messages/export", "async", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+async def export_messages_async(fmt: TransferFormat = Query("ndjson", alias="format"), service: MessageService = Depends()):
+    return export_response(service.export_messages_async(fmt), fmt)
+
+@message_route("POST", "/messages/import", "async", response_model=MessageImportResponse, status_code=status.HTTP_201_CREATED, openapi_extra=IMPORT_REQUEST_BODY)
+async def import_messages_async(request: Request, fmt: TransferFormat = Query("ndjson", alias="format"), service: MessageService = Depends()):
+    return {"imported": await service.import_messages_async(import_records(request.stream(), fmt))}
+
+@message_route("GET", "/messages/{message_id}", "async", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+async def get_message_async(message_id: UUID, response: Response, if_none_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    if if_none_match:
+        current = await service.get_message_version_async(message_id)
+        if etag_matches(if_none_match, message_etag(current.version)):
+            return not_modified(message_etag(current.version), current.updated_at)
+    return set_message_validators(response, await service.get_message_async(message_id))
+
+@message_route("PUT", "/messages/{message_id}", "async", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+async def update_message_async(message_id: UUID, message_data: MessageBase, response: Response, if_match: Optional[str] = Header(None), service: MessageService = Depends()):
+    return set_message_validators(response, await service.update_message_async(message_id, message_data, if_match_versions(if_match)))
+
+@message_route("DELETE", "/messages/{message_id}", "async", response_model=MessageSchema, status_code=status.HTTP_200_OK)
+async def delete_message_async(message_id: UUID, service: MessageService = Depends()):
+    return await service.delete_message_async(message_id)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from backend.fastapi.core.metrics import render_stats, request_metrics
+from backend.fastapi.dependencies.cache import message_cache
+from backend.fastapi.dependencies.database import get_async_engine, get_sync_engine, pool_status
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    lines = [request_metrics.render()]
+    lines.extend(render_stats("message_cache", message_cache.stats(), {}))
+    lines.extend(render_stats("db_pool", pool_status(get_sync_engine()), {"engine": "sync"}))
+    lines.extend(render_stats("db_pool", pool_status(get_async_engine().sync_engine), {"engine": "async"}))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from backend.fastapi.core.metrics import request_metrics
+from backend.fastapi.dependencies.cache import message_cache
+from backend.fastapi.dependencies.events import message_events
+from backend.fastapi.dependencies.database import get_async_engine, get_sync_engine, pool_status
+from backend.fastapi.dependencies import rate_limiter
+
+router = APIRouter()
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    return message_cache.stats()
+
+@router.get("/stats/pool")
+async def get_pool_stats():
+    return {
+        "sync": pool_status(get_sync_engine()),
+        "async": pool_status(get_async_engine().sync_engine),
+    }
+
+@router.get("/stats/latency")
+async def get_latency_stats():
+    return request_metrics.summary()
+
+@router.get("/stats/rate-limit")
+async def get_rate_limit_stats():
+    return rate_limiter.rate_limit_backend.stats()
+
+@router.get("/stats/events")
+async def get_event_stats():
+    return message_events.stats()
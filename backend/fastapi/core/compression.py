@@ -0,0 +1,55 @@
+import gzip
+
+# Types worth compressing; images other than icons and SVG are compressed already
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "image/vnd.microsoft.icon",
+    "image/x-icon",
+})
+
+# Added inside the quotes of an ETag when a response is compressed on the fly, so the gzipped and
+# plain representations never share a strong validator
+GZIP_ETAG_SUFFIX = "-gzip"
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    # gzip, or *, listed with a non-zero q value; an explicit gzip;q=0 wins over *
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip()] = quality
+    if "gzip" in qualities:
+        return qualities["gzip"] > 0
+    return qualities.get("*", 0) > 0
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    if media_type.startswith("text/"):
+        # Event streams are read as they arrive, not once complete
+        return media_type != "text/event-stream"
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith(("+json", "+xml"))
+
+def gzip_bytes(data: bytes, level: int) -> bytes:
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def gzip_etag(etag: str) -> str:
+    # '"5"' -> '"5-gzip"', keeping any W/ prefix
+    if len(etag) < 2 or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}{GZIP_ETAG_SUFFIX}"'
+
+def strip_gzip_etag(etag: str) -> str:
+    # The inverse of gzip_etag, for comparing validators sent back by clients
+    suffix = f'{GZIP_ETAG_SUFFIX}"'
+    return etag[:-len(suffix)] + '"' if etag.endswith(suffix) else etag
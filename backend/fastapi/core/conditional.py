@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Iterable, List, Optional
+from fastapi import Response
+from backend.fastapi.core.compression import strip_gzip_etag
+
+def message_etag(version: int) -> str:
+    # Strong validator from the message's version, which every update bumps
+    return f'"{version}"'
+
+def list_etag(messages: Iterable) -> str:
+    # A page changes when any message on it is updated, added or removed
+    digest = hashlib.blake2b(digest_size=16)
+    for message in messages:
+        digest.update(f"{message.id}:{message.version};".encode())
+    return f'"{digest.hexdigest()}"'
+
+def http_date(value: datetime) -> str:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires; the -gzip suffix GZipMiddleware adds is ignored
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(strip_gzip_etag(tag.strip().removeprefix("W/")) == etag for tag in if_none_match.split(","))
+
+def if_match_versions(if_match: Optional[str]) -> Optional[List[int]]:
+    # None when any version will do; otherwise the versions a PUT may overwrite
+    if not if_match or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = strip_gzip_etag(tag.strip())
+        # Strong comparison: weak or malformed tags never match
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
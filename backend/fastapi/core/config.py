@@ -1,6 +1,18 @@
 import os
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Async driver for each sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme + '+asyncpg')}://{rest}"
+
 class Settings(BaseSettings):
     # Application settings
     APP_NAME: str = "My App"
@@ -10,6 +22,95 @@ class Settings(BaseSettings):
     USER_NAME: str = os.getenv('USER_NAME', '')
     PASSWORD: str = os.getenv('PASSWORD', '')
 
+    # Worker processes for `--mode prod`, each with its own connection pools, and how long
+    # a worker lets in-flight requests finish on shutdown
+    WEB_CONCURRENCY: int = 1
+    SHUTDOWN_TIMEOUT: float = 30.0
+
+    # Engine behind the unsuffixed /api/v1/messages routes; both stay reachable under /sync and /async
+    DEFAULT_DB_ENGINE: Literal["sync", "async"] = "sync"
+
+    # Create missing tables, and add missing message columns, on startup; turn off when migrations own the schema
+    DB_CREATE_SCHEMA: bool = True
+
+    # Most messages one /messages/bulk request may create; bulk inserts of at least
+    # BULK_COPY_THRESHOLD rows use COPY on PostgreSQL
+    BULK_CREATE_MAX_MESSAGES: int = 10000
+    BULK_COPY_THRESHOLD: int = 1000
+
+    # Rows fetched per round trip by /messages/export, and inserted per statement by /messages/import
+    EXPORT_BATCH_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 1000
+
+    # Most ids looked up by one /messages/batch-get request, or by one query of the async message loader
+    BATCH_GET_MAX_IDS: int = 1000
+
+    # Connection pool, applied to both the sync and the async engine
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+
+    # Comma-separated read-replica URLs. Reads go to a replica unless the request has written,
+    # or the client wrote within READ_YOUR_WRITES_SECONDS (tracked with a cookie) or sent X-Read-Primary: 1
+    DB_REPLICA_URLS: str = ''
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # SQL instrumentation. Statements slower than SLOW_QUERY_SECONDS are logged (0 turns that off), and so
+    # are statements one request runs QUERY_REPEAT_WARNING times or more, the usual sign of an N+1 query.
+    SLOW_QUERY_SECONDS: float = 0.2
+    QUERY_REPEAT_WARNING: int = 10
+    # Server-Timing header with each request's database time. It shows clients how long queries take.
+    SERVER_TIMING_ENABLED: bool = True
+
+    # gzip for complete responses of at least GZIP_MIN_SIZE bytes when the client accepts it; streamed
+    # responses are never compressed. Static files are precompressed instead, when built by the server
+    # before it starts (STATIC_BUILD_ON_STARTUP) or by `python -m backend.fastapi.core.static`.
+    GZIP_ENABLED: bool = True
+    GZIP_MIN_SIZE: int = 1000
+    GZIP_LEVEL: int = 6
+    STATIC_BUILD_ON_STARTUP: bool = True
+
+    # Run SQLite in WAL mode so reads don't block behind writes
+    SQLITE_WAL: bool = True
+
+    # Group commit for POST /api/v1/messages/async: concurrent creates are written together
+    # once WRITE_BATCH_SIZE rows are queued or WRITE_BATCH_FLUSH_INTERVAL seconds have passed
+    WRITE_BATCH_ENABLED: bool = False
+    WRITE_BATCH_SIZE: int = 100
+    WRITE_BATCH_FLUSH_INTERVAL: float = 0.005
+
+    # Single-message read cache; set MESSAGE_CACHE_URL (redis://...) to share it across workers
+    MESSAGE_CACHE_SIZE: int = 10000
+    MESSAGE_CACHE_TTL: float = 60.0
+    MESSAGE_CACHE_URL: str = ''
+
+    # Exact message counts behind X-Total-Count are reused for this long by each worker
+    TOTAL_COUNT_TTL: float = 10.0
+
+    # Change feed (/messages/stream, /messages/ws). Each subscriber queues at most MESSAGE_EVENTS_QUEUE_SIZE
+    # events and drops the oldest past that. Set MESSAGE_EVENTS_URL (redis://...) to share events across workers.
+    MESSAGE_EVENTS_QUEUE_SIZE: int = 100
+    MESSAGE_EVENTS_URL: str = ''
+    # Idle SSE streams send a comment this often, so proxies don't close them
+    MESSAGE_EVENTS_PING_SECONDS: float = 15.0
+
+    # Serve message lists from plain row tuples encoded once (with orjson when installed),
+    # instead of validating ORM objects into MessageSchema and running the standard encoder
+    FAST_JSON_RESPONSES: bool = True
+
+    # Token-bucket rate limits on the message API, per client and per client and route.
+    # Buckets live in process (RATE_LIMIT_SHARDS shards holding at most RATE_LIMIT_MAX_KEYS
+    # clients); set RATE_LIMIT_URL (redis://...) to share the limits across workers
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_CLIENT_TIMES: int = 600
+    RATE_LIMIT_ROUTE_TIMES: int = 300
+    RATE_LIMIT_SECONDS: float = 60.0
+    RATE_LIMIT_SHARDS: int = 16
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_URL: str = ''
+
     @property
     def DB_URL(self):
         if self.ENV_MODE == "dev":
@@ -30,11 +131,10 @@ class Settings(BaseSettings):
     @property
     def ASYNC_DB_URL(self):
         if self.ENV_MODE == "dev":
-            return "sqlite+aiosqlite:///./dev.db"
+            return to_async_url(self.DEV_DB_URL)
         else:
             if self.DATABASE_URL:
-                URL_split = self.DATABASE_URL.split("://")
-                return f"{URL_split[0]}+asyncpg://{URL_split[1]}"
+                return to_async_url(self.DATABASE_URL)
             else:
                 return '{}+asyncpg://{}:{}@{}:{}/{}'.format(
                     self.DB_ENGINE,
@@ -45,6 +145,10 @@ class Settings(BaseSettings):
                     self.DB_NAME
                 )
 
+    @property
+    def REPLICA_URLS(self):
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
+
     @property
     def API_BASE_URL(self) -> str:
         if self.ENV_MODE == "dev":
@@ -75,6 +179,24 @@ class ProdSettings(Settings):
     # Extra Database settings for deploying on Railway; if you provide DATABASE_URL, the above settings will be ignored
     DATABASE_URL: str = os.getenv('DATABASE_URL', '')
 
+    # Connection pool sized for a shared server; connections are recycled before
+    # idle timeouts on the server or proxies and pinged before reuse
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    RATE_LIMIT_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = False
+    # The image is built with the static files; containers may not be able to write to the tree
+    STATIC_BUILD_ON_STARTUP: bool = False
+
+    # Set explicitly, e.g. to the cores the container may use; keep WEB_CONCURRENCY * 2 * (DB_POOL_SIZE +
+    # DB_MAX_OVERFLOW) under the server's max_connections. More than one worker needs RATE_LIMIT_URL and
+    # MESSAGE_EVENTS_URL, and uses no message cache without MESSAGE_CACHE_URL.
+    WEB_CONCURRENCY: int = 1
+
     # Define HOST_URL based on environment mode
     HOST_URL : str = os.getenv('HOST_URL ', '')
 
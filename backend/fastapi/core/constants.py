@@ -0,0 +1,4 @@
+import uuid
+
+# Namespace for deterministic ids of seed rows, so seeding on every boot is idempotent
+SEED_NAMESPACE = uuid.UUID("6f1c5d1e-3b7a-4c1e-9a8e-2d4f0b6c7e91")
@@ -1,24 +1,38 @@
-import sys
-import argparse
-from backend.fastapi.core.config import get_settings
+import os
+from backend.fastapi.core.config import Settings, get_settings
 
-# Set up the argument parser
-parser = argparse.ArgumentParser()
-parser.add_argument("--mode", choices=["dev", "prod"], default="dev", help="Set the running mode")
-parser.add_argument("--host", type=str, default="127.0.0.1", help="Set the host")
+class SettingsProxy:
+    """Stands in for the active Settings, so modules can import it before settings are chosen.
 
-# Determine if running under pytest
-is_testing = "pytest" in sys.argv[0]
+    The settings are loaded on first use, for the mode in the ENV_MODE environment variable
+    ('dev' by default), unless configure_settings installed others first.
+    """
 
-if is_testing:
-    # Provide default or mock arguments when imported for testing
-    args = argparse.Namespace(mode="dev", host="127.0.0.1")
-else:
-    # Parse arguments only when running the script directly
-    args = parser.parse_args()
+    def __init__(self):
+        object.__setattr__(self, "_settings", None)
 
-# Initialize and update settings
-settings = get_settings(args.mode)
+    def get(self) -> Settings:
+        settings = object.__getattribute__(self, "_settings")
+        if settings is None:
+            settings = get_settings(os.getenv("ENV_MODE", "dev"))
+            object.__setattr__(self, "_settings", settings)
+        return settings
 
-# Save updated settings for import in other modules
+    def configure(self, settings: Settings):
+        object.__setattr__(self, "_settings", settings)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.get(), name)
+
+# Settings for import in other modules
+settings = SettingsProxy()
 global_settings = settings
+
+def configure_settings(new_settings: Settings):
+    global_settings.configure(new_settings)
@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Latency buckets in seconds, Prometheus' defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation, like histogram_quantile()
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class RequestMetrics:
+    """Request counters and latency histograms keyed by route template.
+
+    Only updated from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, status_code: int, duration: float):
+        key = (method, route, status_code)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram(self.buckets)
+        histogram.observe(duration)
+
+    def summary(self) -> List[dict]:
+        return [
+            {
+                "method": method,
+                "route": route,
+                "count": histogram.count,
+                "avg_ms": round(histogram.sum / histogram.count * 1000, 3),
+                "p50_ms": round(histogram.quantile(0.5) * 1000, 3),
+                "p95_ms": round(histogram.quantile(0.95) * 1000, 3),
+                "p99_ms": round(histogram.quantile(0.99) * 1000, 3),
+            }
+            for (method, route), histogram in sorted(self.latency.items())
+        ]
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests served, by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status_code), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{escape(route)}",status="{status_code}"}} {count}')
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{escape(route)}"'
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_stats(name: str, stats: dict, labels: Dict[str, str]) -> Iterable[str]:
+    # Expose the numeric fields of a stats dict as untyped samples
+    label_text = ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{name}_{key}{{{label_text}}} {value}"
+
+request_metrics = RequestMetrics()
@@ -1,8 +1,14 @@
-from fastapi import Request
+import time
+from typing import List
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.responses import RedirectResponse
+from backend.fastapi.core.compression import accepts_gzip, gzip_bytes, gzip_etag, is_compressible
 from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.core.metrics import RequestMetrics, request_metrics
+from backend.fastapi.dependencies.database import QueryStats, current_query_stats, log_repeated_queries
 
 def setup_cors(app):
     # Define the allowed origins
@@ -19,20 +25,204 @@ def setup_cors(app):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
     )
 
+# Paths that read or write the session; everything else skips the cookie entirely
+SESSION_PATHS = frozenset({"/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json", "/login", "/logout"})
+
+# Paths that require a logged-in session
+DOC_PATHS = frozenset({"/docs", "/redoc", "/openapi.json"})
+
+class ScopedSessionMiddleware:
+    """Pure ASGI wrapper running SessionMiddleware only on `paths`, so other requests never decode or sign the cookie."""
+
+    def __init__(self, app, paths=SESSION_PATHS, **session_options):
+        self.app = app
+        self.paths = paths
+        self.session_app = SessionMiddleware(app, **session_options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            await self.session_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+class DocProtectMiddleware:
+    """Pure ASGI middleware redirecting unauthenticated requests for the API docs to /login."""
+
+    def __init__(self, app, paths=DOC_PATHS):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            if not scope.get("session", {}).get("authenticated"):
+                await RedirectResponse(url="/login")(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
 def setup_session(app):
     # Add session middleware with a custom expiration time (e.g., 30 minutes)
-    app.add_middleware(SessionMiddleware, 
-                       secret_key="your_secret_key", 
+    app.add_middleware(ScopedSessionMiddleware,
+                       secret_key="your_secret_key",
                        max_age=1800)  # 1800 seconds = 30 minutes
 
-async def doc_protect_middleware(request: Request, call_next):
-    if request.url.path in ["/docs", "/redoc", "/openapi.json"]:
-        if not request.session.get('authenticated'):
-            return RedirectResponse(url="/login")
-    response = await call_next(request)
-    return response
-
 def add_doc_protect(app):
-    app.middleware("http")(doc_protect_middleware)
\ No newline at end of file
+    # Must sit inside setup_session's middleware, which fills in the session it reads
+    app.add_middleware(DocProtectMiddleware)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts and latency per route template."""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            # The router stores the matched route in the scope; label by its template, not the raw path
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            self.metrics.observe(scope["method"], route_path, status_code, time.perf_counter() - start)
+
+def server_timing(stats: QueryStats, elapsed: float) -> str:
+    # Database time, its slowest statement, and the rest of the request so far
+    metrics = [f'db;dur={stats.total_seconds * 1000:.3f};desc="{stats.count} queries"']
+    if stats.count:
+        metrics.append(f"db-slowest;dur={stats.slowest_seconds * 1000:.3f}")
+    metrics.append(f"app;dur={max(elapsed - stats.total_seconds, 0) * 1000:.3f}")
+    return ", ".join(metrics)
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware collecting the SQL statements each request runs.
+
+    Adds a Server-Timing header when SERVER_TIMING_ENABLED, and logs statements the request
+    repeated QUERY_REPEAT_WARNING times. Streaming bodies run their queries after the headers
+    are sent, so their timing covers only the work before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope["method"], scope["path"])
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and global_settings.SERVER_TIMING_ENABLED:
+                MutableHeaders(scope=message).append("Server-Timing", server_timing(stats, time.perf_counter() - start))
+            await send(message)
+
+        token = current_query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            log_repeated_queries(stats)
+
+def setup_query_stats(app):
+    app.add_middleware(QueryStatsMiddleware)
+
+# Bodies at least this large are compressed in the threadpool, off the event loop
+GZIP_THREADPOOL_SIZE = 256 * 1024
+
+def if_none_match_tags(headers: Headers) -> List[str]:
+    return [tag.strip().removeprefix("W/") for tag in headers.get("if-none-match", "").split(",")]
+
+class GZipMiddleware:
+    """Pure ASGI middleware gzipping complete responses of at least `minimum_size` bytes for clients
+    that accept it. Streamed responses (more_body on the first chunk, as export and the event
+    stream send), already encoded ones and types that don't compress are sent as they are. An ETag
+    on a compressed response, and on a 304 revalidating one, gets a -gzip suffix, which
+    etag_matches ignores."""
+
+    def __init__(self, app, minimum_size: int, level: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        if not accepts_gzip(request_headers.get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if message["status"] == 304:
+                    # Revalidating a gzipped response keeps its -gzip ETag, so caches that take
+                    # validators from the 304 don't switch to the plain one
+                    headers = MutableHeaders(scope=message)
+                    etag = headers.get("etag", "")
+                    if etag and gzip_etag(etag.removeprefix("W/")) in if_none_match_tags(request_headers):
+                        headers["ETag"] = gzip_etag(etag)
+                    await send(message)
+                    return
+                # Held back until the first body chunk shows whether the response is streamed
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if (
+                message["type"] != "http.response.body"
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type", ""))
+            ):
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= GZIP_THREADPOOL_SIZE:
+                body = await run_in_threadpool(gzip_bytes, body, self.level)
+            else:
+                body = gzip_bytes(body, self.level)
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(body))
+            if "etag" in headers:
+                headers["ETag"] = gzip_etag(headers["etag"])
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+def setup_compression(app):
+    if global_settings.GZIP_ENABLED:
+        app.add_middleware(GZipMiddleware, minimum_size=global_settings.GZIP_MIN_SIZE, level=global_settings.GZIP_LEVEL)
+
+def setup_metrics(app):
+    # Added last so it wraps every other middleware
+    app.add_middleware(MetricsMiddleware, metrics=request_metrics)
@@ -1,7 +1,15 @@
 from fastapi import FastAPI
-from backend.fastapi.api.v1.endpoints import base, doc, message
 
 def setup_routers(app: FastAPI):
+    # Endpoint modules (and the models and services behind them) load when the app is built
+    from backend.fastapi.api.v1.endpoints import base, doc, feed, message, metrics, stats
+    from backend.fastapi.core.init_settings import global_settings as settings
+
     app.include_router(base.router, prefix="", tags=["main"])
     app.include_router(doc.router, prefix="", tags=["doc"])
+    app.include_router(metrics.router, prefix="", tags=["metrics"])
+    app.include_router(feed.router, prefix="/api/v1", tags=["message"])
     app.include_router(message.router, prefix="/api/v1", tags=["message"])
+    # DEFAULT_DB_ENGINE is read here, so each create_app(settings) picks its own
+    app.include_router(message.default_routers[settings.DEFAULT_DB_ENGINE], prefix="/api/v1", tags=["message"])
+    app.include_router(stats.router, prefix="/api/v1", tags=["stats"])
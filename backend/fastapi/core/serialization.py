@@ -0,0 +1,116 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Sequence, Tuple
+from uuid import UUID
+from fastapi import Response
+from sqlalchemy import Row
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+def default(value: Any):
+    # Same shapes as pydantic's JSON mode: ISO 8601 datetimes, UUIDs as strings
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(content: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def dump_rows(rows: Iterable[Row]) -> bytes:
+    return dumps([row._asdict() for row in rows])
+
+def dump_ndjson_rows(rows: Iterable[Row]) -> bytes:
+    return b"".join(dumps(row._asdict()) + b"\n" for row in rows)
+
+def csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, UUID)):
+        return default(value)
+    return value
+
+def dump_csv_rows(rows: Iterable[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+# Longest line (or multi-line CSV record) accepted from a streamed body
+MAX_RECORD_LENGTH = 1 << 20
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    # Lines of a UTF-8 body, decoded as the chunks arrive
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(pending) > MAX_RECORD_LENGTH:
+            raise ValueError(f"Line longer than {MAX_RECORD_LENGTH} characters")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def ndjson_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    # (line number, value) for every non-blank line
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: invalid JSON ({e})") from e
+
+async def csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    # (line number, {header: value}) for every record after the header row.
+    # A quoted field may span lines, so lines are joined until the quotes balance.
+    header = None
+    record, quotes, length = [], 0, 0
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        record.append(line)
+        quotes += line.count('"')
+        length += len(line)
+        if quotes % 2:
+            if length > MAX_RECORD_LENGTH:
+                raise ValueError(f"line {line_number}: record longer than {MAX_RECORD_LENGTH} characters")
+            continue
+        text = "\n".join(record)
+        record, quotes, length = [], 0, 0
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            raise ValueError(f"line {line_number}: expected {len(header)} fields, got {len(values)}")
+        yield line_number, dict(zip(header, values))
+    if record:
+        raise ValueError(f"line {line_number}: unterminated quoted field")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # Already-encoded bodies pass straight through
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
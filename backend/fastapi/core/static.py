@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+from functools import lru_cache
+from typing import Dict
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from backend.fastapi.core.compression import accepts_gzip, gzip_bytes, is_compressible
+
+STATIC_DIR = "frontend/login/static"
+# Generated from STATIC_DIR by build_static, at image build or server start; not committed
+STATIC_BUILD_DIR = "frontend/login/static_build"
+STATIC_URL = "/static/"
+MANIFEST = "manifest.json"
+
+# Hashed names change whenever their content does, so they can be cached for good
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+logger = logging.getLogger("uvicorn.error")
+
+def hashed_name(name: str, content: bytes) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+def load_manifest(directory: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_file(path: str, content: bytes):
+    # Written aside and renamed into place, so other workers never serve a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+def build_static(source: str = STATIC_DIR, target: str = STATIC_BUILD_DIR) -> Dict[str, str]:
+    """Copy `source` into `target` under both the original and a content-hashed name, each with a
+    gzip sibling when that is smaller, then write the manifest of hashed names. Skipped when the
+    manifest already matches `source`. Returns the manifest."""
+    contents = {}
+    for root, _, files in os.walk(source):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            with open(path, "rb") as f:
+                contents[os.path.relpath(path, source).replace(os.sep, "/")] = f.read()
+    manifest = {name: hashed_name(name, content) for name, content in sorted(contents.items())}
+    if load_manifest(target) == manifest:
+        return manifest
+
+    for name, content in contents.items():
+        compressed = None
+        if is_compressible(mimetypes.guess_type(name)[0] or ""):
+            # Built once, so use the smallest output rather than the fastest
+            compressed = gzip_bytes(content, 9)
+            if len(compressed) >= len(content):
+                compressed = None
+        for built_name in (name, manifest[name]):
+            path = os.path.join(target, built_name)
+            write_file(path, content)
+            if compressed is not None:
+                write_file(f"{path}.gz", compressed)
+    # Last, so the manifest only names files that are in place; files of earlier builds stay
+    # for pages that still link to them
+    write_file(os.path.join(target, MANIFEST), json.dumps(manifest, indent=2).encode())
+    static_manifest.cache_clear()
+    return manifest
+
+def prepare_static():
+    # Run by the server before it starts its workers; create_app only looks for the result
+    try:
+        build_static()
+    except OSError as e:
+        logger.warning("Serving %s as is; could not build %s: %s", STATIC_DIR, STATIC_BUILD_DIR, e)
+
+def static_directory() -> str:
+    # The directory to serve: the build when there is one, else the plain source files
+    return STATIC_BUILD_DIR if load_manifest(STATIC_BUILD_DIR) else STATIC_DIR
+
+@lru_cache(maxsize=None)
+def static_manifest() -> Dict[str, str]:
+    return load_manifest(STATIC_BUILD_DIR)
+
+def static_url(name: str) -> str:
+    # URL of the hashed copy when the assets are built, for templates
+    return STATIC_URL + static_manifest().get(name, name)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving a file's .gz sibling to clients that accept gzip, so assets are
+    compressed once rather than per request. Hashed names from the directory's manifest are
+    cached for a year; other files are revalidated on every use."""
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.hashed_names = frozenset(load_manifest(directory).values())
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        gzip_path = f"{full_path}.gz"
+        precompressed = os.path.isfile(gzip_path)
+        if precompressed and accepts_gzip(request_headers.get("accept-encoding", "")):
+            response = FileResponse(
+                gzip_path,
+                status_code=status_code,
+                stat_result=os.stat(gzip_path),
+                media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+                headers={"Content-Encoding": "gzip"},
+            )
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if precompressed:
+            response.headers["Vary"] = "Accept-Encoding"
+        name = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        response.headers["Cache-Control"] = IMMUTABLE if name in self.hashed_names else "no-cache"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+if __name__ == "__main__":
+    # Run at image build time: python -m backend.fastapi.core.static
+    print(f"Built {len(build_static())} static files into {STATIC_BUILD_DIR}")
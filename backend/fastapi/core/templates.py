@@ -0,0 +1,10 @@
+from functools import lru_cache
+from fastapi.templating import Jinja2Templates
+from backend.fastapi.core.static import static_url
+
+@lru_cache(maxsize=None)
+def get_templates() -> Jinja2Templates:
+    # One shared instance, created when a page is first rendered
+    templates = Jinja2Templates(directory="frontend/login/templates")
+    templates.env.globals["static_url"] = static_url
+    return templates
@@ -0,0 +1,97 @@
+import asyncio
+import weakref
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.dependencies.database import get_async_sessionmaker
+from backend.fastapi.models import Message
+
+class MessageWriteBatcher:
+    """Group commit for async message creation.
+
+    Rows submitted concurrently are queued and written with one multi-row INSERT and one
+    commit once the batch is full or the flush interval has passed. Each caller awaits the
+    outcome of the batch holding its row.
+    """
+
+    def __init__(self, max_batch_size: int, flush_interval: float, session_factory=None):
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        # Defaults to the async engine's sessionmaker, looked up when the batch is written
+        self.session_factory = session_factory
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes = set()
+
+    async def submit(self, row: dict):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+        # Shielded so a cancelled request doesn't cancel the write shared with other callers
+        await asyncio.shield(future)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def drain(self):
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            await self._insert([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                set_outcome(batch[0][1], e)
+                return
+            # Retry row by row so one bad row only fails its own caller
+            for row, future in batch:
+                try:
+                    await self._insert([row])
+                except Exception as row_error:
+                    set_outcome(future, row_error)
+                else:
+                    set_outcome(future)
+        else:
+            for _, future in batch:
+                set_outcome(future)
+
+    async def _insert(self, rows: List[dict]):
+        async with (self.session_factory or get_async_sessionmaker())() as db:
+            await db.execute(insert(Message), rows)
+            await db.commit()
+
+def set_outcome(future: asyncio.Future, error: Optional[Exception] = None):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+# Batches are bound to the event loop that owns their futures and timer
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, MessageWriteBatcher]" = weakref.WeakKeyDictionary()
+
+def get_write_batcher() -> MessageWriteBatcher:
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = MessageWriteBatcher(settings.WRITE_BATCH_SIZE, settings.WRITE_BATCH_FLUSH_INTERVAL)
+    return batcher
+
+async def drain_write_batcher():
+    batcher = _batchers.get(asyncio.get_running_loop())
+    if batcher is not None:
+        await batcher.drain()
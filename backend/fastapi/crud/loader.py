@@ -0,0 +1,68 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+BatchLoad = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+class DataLoader:
+    """Request-scoped batching for async lookups by key.
+
+    Keys passed to load() in the same event-loop tick are fetched with one `batch_load` call
+    (split every `max_batch_size` keys), and each key is fetched at most once per loader.
+    `batch_load` returns the values it found; load() returns None for the others. Batches run
+    one at a time, so `batch_load` may use the request's session.
+    """
+
+    def __init__(self, batch_load: BatchLoad, max_batch_size: int):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Tuple[Hashable, asyncio.Future]] = []
+        self._dispatches = set()
+        self._lock = asyncio.Lock()
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._queue.append((key, future))
+            if len(self._queue) == 1:
+                # Runs once the coroutines already scheduled in this tick have asked for their keys
+                loop.call_soon(self._dispatch)
+        # Shielded so one cancelled caller doesn't cancel the lookup shared with the others
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable]) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value: Any):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._futures[key] = future
+
+    def clear(self, key: Hashable):
+        self._futures.pop(key, None)
+
+    def _dispatch(self):
+        queue, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._load_batches(queue))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _load_batches(self, queue: List[Tuple[Hashable, asyncio.Future]]):
+        async with self._lock:
+            for start in range(0, len(queue), self.max_batch_size):
+                await self._load_batch(queue[start:start + self.max_batch_size])
+
+    async def _load_batch(self, batch: List[Tuple[Hashable, asyncio.Future]]):
+        try:
+            values = await self.batch_load([key for key, _ in batch])
+        except Exception as e:
+            for key, future in batch:
+                # Not remembered, so a later load() tries again
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+                future.set_exception(e)
+            return
+        for key, future in batch:
+            future.set_result(values.get(key))
@@ -1,65 +1,569 @@
-from typing import List
+import csv
+import io
+import uuid
+from typing import AsyncIterable, AsyncIterator, Dict, Iterator, List, Literal, Optional, Union
 from uuid import UUID
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import Row, and_, column, delete, false, func, insert, literal_column, or_, select, table, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.fastapi.dependencies.database import get_sync_db, get_async_db
+from backend.fastapi.core.constants import SEED_NAMESPACE
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.core.serialization import csv_records, dump_csv_rows, dump_ndjson_rows, ndjson_records
+from backend.fastapi.dependencies.cache import message_cache, message_count_cache
+from backend.fastapi.dependencies.events import message_events
+from backend.fastapi.dependencies.database import (
+    LazySessions,
+    get_async_sessionmaker,
+    get_lazy_db,
+    get_sync_sessionmaker,
+)
+from backend.fastapi.crud.batcher import get_write_batcher
+from backend.fastapi.crud.loader import DataLoader
+from backend.fastapi.crud.pagination import decode_cursor
 from backend.fastapi.models import Message
+from backend.fastapi.models.message import content_search_vector, utc_now
 from backend.fastapi.schemas import (
     MessageBase,
     MessageCreate,
+    MessageSchema,
 )
 
+MESSAGE_COLUMNS = (Message.id, Message.content, Message.created_at, Message.version, Message.updated_at)
+
+TransferFormat = Literal["ndjson", "csv"]
+
+TRANSFER_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+# The SQLite FTS5 index created alongside the messages table
+messages_fts = table("messages_fts", column("id"), column("rank"))
+
 class MessageService:
-    def __init__(self, db_sync: Session = Depends(get_sync_db), db_async: AsyncSession = Depends(get_async_db)):
-        self.db_sync = db_sync
-        self.db_async = db_async
+    def __init__(self, db: LazySessions = Depends(get_lazy_db)):
+        # Sessions are opened on first use, so each request only touches the engine it needs
+        self.db = db
+        self._loader: Optional[DataLoader] = None
+
+    @property
+    def db_sync(self) -> Session:
+        return self.db.sync_session
+
+    @property
+    def db_async(self) -> AsyncSession:
+        return self.db.async_session
+
+    @property
+    def db_sync_read(self) -> Session:
+        # A replica when configured; see LazySessions
+        return self.db.sync_read_session
+
+    @property
+    def db_async_read(self) -> AsyncSession:
+        return self.db.async_read_session
+
+    @property
+    def loader(self) -> DataLoader:
+        # Coalesces the get_message_async calls of this request into one query per tick
+        if self._loader is None:
+            self._loader = DataLoader(self.get_messages_by_ids_async, settings.BATCH_GET_MAX_IDS)
+        return self._loader
+
+    def release_sync(self):
+        # Sync endpoints serialize their response in the threadpool. Returning the connection
+        # first keeps a full threadpool waiting on the pool from starving the requests holding it.
+        self.db.close_sync()
 
     def create_message(self, message_data: MessageCreate) -> Message:
         db_message = Message(**message_data.model_dump())
         self.db_sync.add(db_message)
         self.db_sync.commit()
-        self.db_sync.refresh(db_message)
+        # Reads skew towards recent messages, so warm the cache on create
+        message_cache.set(db_message)
+        message_events.publish("created", db_message)
         return db_message
     
     async def create_message_async(self, message_data: MessageCreate) -> Message:
-        db_message = Message(**message_data.model_dump())
-        self.db_async.add(db_message)
-        await self.db_async.commit()
-        await self.db_async.refresh(db_message)
+        if settings.WRITE_BATCH_ENABLED:
+            # Share one INSERT and commit with concurrent creates
+            row = build_message_rows([message_data])[0]
+            await get_write_batcher().submit(row)
+            # The batcher commits in its own session, so record the write here
+            self.db.mark_write()
+            db_message = Message(**row)
+        else:
+            db_message = Message(**message_data.model_dump())
+            self.db_async.add(db_message)
+            await self.db_async.commit()
+        await message_cache.set_async(db_message)
+        await message_events.publish_async("created", db_message)
+        return db_message
+
+    def create_messages_bulk(self, messages_data: List[MessageCreate]) -> List[UUID]:
+        rows = build_message_rows(messages_data)
+        if rows:
+            self.insert_message_rows(rows)
+            self.db_sync.commit()
+            message_events.publish("created", *rows)
+        return [row["id"] for row in rows]
+
+    async def create_messages_bulk_async(self, messages_data: List[MessageCreate]) -> List[UUID]:
+        rows = build_message_rows(messages_data)
+        if rows:
+            await self.insert_message_rows_async(rows)
+            await self.db_async.commit()
+            await message_events.publish_async("created", *rows)
+        return [row["id"] for row in rows]
+
+    def insert_message_rows(self, rows: List[dict]):
+        if use_copy(self.db_sync.get_bind().dialect.name, len(rows)):
+            copy_message_rows(self.db_sync, rows)
+        else:
+            self.db_sync.execute(insert(Message), rows)
+
+    async def insert_message_rows_async(self, rows: List[dict]):
+        if use_copy(self.db_async.get_bind().dialect.name, len(rows)):
+            await copy_message_rows_async(self.db_async, rows)
+        else:
+            await self.db_async.execute(insert(Message), rows)
+
+    async def import_messages(self, messages_data: AsyncIterable[MessageCreate]) -> int:
+        # The body is parsed on the event loop; each batch is inserted in the threadpool.
+        # One transaction, so a bad line part way through imports nothing.
+        imported = 0
+        async for batch in batched(messages_data, settings.IMPORT_BATCH_SIZE):
+            rows = build_message_rows(batch)
+            await run_in_threadpool(self.insert_message_rows, rows)
+            imported += len(rows)
+        if imported:
+            await run_in_threadpool(self.db_sync.commit)
+            # Imports can be any size, so subscribers get one event rather than one per row
+            await message_events.publish_async("imported", count=imported)
+        return imported
+
+    async def import_messages_async(self, messages_data: AsyncIterable[MessageCreate]) -> int:
+        imported = 0
+        async for batch in batched(messages_data, settings.IMPORT_BATCH_SIZE):
+            rows = build_message_rows(batch)
+            await self.insert_message_rows_async(rows)
+            imported += len(rows)
+        if imported:
+            await self.db_async.commit()
+            await message_events.publish_async("imported", count=imported)
+        return imported
+
+    def export_messages(self, fmt: TransferFormat) -> Iterator[bytes]:
+        # The response streams after the request's sessions are closed, so the export opens its own.
+        # yield_per fetches EXPORT_BATCH_SIZE rows at a time (a server-side cursor on PostgreSQL).
+        session_factory = self.db.read_sessionmaker() or get_sync_sessionmaker()
+        encode = dump_csv_rows if fmt == "csv" else dump_ndjson_rows
+
+        def stream():
+            if fmt == "csv":
+                yield dump_csv_rows([[column.key for column in MESSAGE_COLUMNS]])
+            with session_factory() as db:
+                for rows in db.execute(export_query()).partitions():
+                    yield encode(rows)
+        return stream()
+
+    def export_messages_async(self, fmt: TransferFormat) -> AsyncIterator[bytes]:
+        session_factory = self.db.read_sessionmaker(is_async=True) or get_async_sessionmaker()
+        encode = dump_csv_rows if fmt == "csv" else dump_ndjson_rows
+
+        async def stream():
+            if fmt == "csv":
+                yield dump_csv_rows([[column.key for column in MESSAGE_COLUMNS]])
+            async with session_factory() as db:
+                result = await db.stream(export_query())
+                async for rows in result.partitions():
+                    yield encode(rows)
+        return stream()
+
+    def get_messages(self, skip: int = 0, limit: int = 30, cursor: Optional[str] = None) -> List[Message]:
+        messages = self.db_sync_read.execute(messages_query(skip, limit, cursor, Message)).scalars().all()
+        self.release_sync()
+        return messages
+
+    def get_message_rows(self, skip: int = 0, limit: int = 30, cursor: Optional[str] = None) -> List[Row]:
+        # Plain column tuples for the fast JSON path, skipping the ORM identity map
+        rows = self.db_sync_read.execute(messages_query(skip, limit, cursor, *MESSAGE_COLUMNS)).all()
+        self.release_sync()
+        return rows
+
+    async def get_messages_async(self, skip: int = 0, limit: int = 30, cursor: Optional[str] = None) -> List[Message]:
+        result = await self.db_async_read.execute(messages_query(skip, limit, cursor, Message))
+        return result.scalars().all()
+
+    async def get_message_rows_async(self, skip: int = 0, limit: int = 30, cursor: Optional[str] = None) -> List[Row]:
+        result = await self.db_async_read.execute(messages_query(skip, limit, cursor, *MESSAGE_COLUMNS))
+        return result.all()
+
+    def count_messages(self, exact: bool = False) -> int:
+        # The planner's estimate where there is one, otherwise an exact count reused for TOTAL_COUNT_TTL.
+        # The read session stays open for the listing query that follows, which releases it.
+        db = self.db_sync_read
+        if not exact:
+            estimate = estimate_count_query(db.get_bind().dialect.name)
+            count = db.scalar(estimate) if estimate is not None else None
+            if count is not None and count > 0:
+                return count
+        count = message_count_cache.get()
+        if count is None:
+            count = db.scalar(select(func.count()).select_from(Message))
+            message_count_cache.set(count)
+        return count
+
+    async def count_messages_async(self, exact: bool = False) -> int:
+        db = self.db_async_read
+        if not exact:
+            estimate = estimate_count_query(db.get_bind().dialect.name)
+            count = await db.scalar(estimate) if estimate is not None else None
+            if count is not None and count > 0:
+                return count
+        count = message_count_cache.get()
+        if count is None:
+            count = await db.scalar(select(func.count()).select_from(Message))
+            message_count_cache.set(count)
+        return count
+
+    def search_messages(self, q: str, skip: int = 0, limit: int = 30) -> List[Row]:
+        query = search_query(self.db_sync_read.get_bind().dialect.name, q, skip, limit, *MESSAGE_COLUMNS)
+        rows = self.db_sync_read.execute(query).all()
+        self.release_sync()
+        return rows
+
+    async def search_messages_async(self, q: str, skip: int = 0, limit: int = 30) -> List[Row]:
+        query = search_query(self.db_async_read.get_bind().dialect.name, q, skip, limit, *MESSAGE_COLUMNS)
+        result = await self.db_async_read.execute(query)
+        return result.all()
+
+    def get_message(self, message_id: UUID) -> Union[Message, MessageSchema]:
+        # Clients reading their own writes skip the cache
+        if not self.db.read_primary:
+            cached = message_cache.get(message_id)
+            if cached is not None:
+                return cached
+        db_message = self.db_sync_read.query(Message).filter(Message.id == message_id).first()
+        self.release_sync()
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        if self.db.reads_from_primary:
+            # A lagging replica could overwrite the version a write just cached
+            message_cache.set(db_message)
+        return db_message
+
+    async def get_message_async(self, message_id: UUID) -> Union[Message, MessageSchema]:
+        db_message = await self.loader.load(message_id)
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
         return db_message
 
-    def get_messages(self, skip: int = 0, limit: int = 30) -> List[Message]:
-        return self.db_sync.query(Message).offset(skip).limit(limit).all()
+    def get_messages_by_ids(self, message_ids: List[UUID]) -> Dict[UUID, Union[Message, MessageSchema]]:
+        # Cache first, then one IN query for the rest; ids that don't exist are left out.
+        # As in get_message, the cache is skipped for read_primary and only filled from the primary.
+        found = message_cache.get_many(message_ids) if not self.db.read_primary else {}
+        missing = [message_id for message_id in dict.fromkeys(message_ids) if message_id not in found]
+        if missing:
+            db_messages = self.db_sync_read.execute(select(Message).where(Message.id.in_(missing))).scalars().all()
+            self.release_sync()
+            if self.db.reads_from_primary:
+                message_cache.set_many(db_messages)
+            found.update((db_message.id, db_message) for db_message in db_messages)
+        return found
 
-    def get_message(self, message_id: UUID) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+    async def get_messages_by_ids_async(self, message_ids: List[UUID]) -> Dict[UUID, Union[Message, MessageSchema]]:
+        found = await message_cache.get_many_async(message_ids) if not self.db.read_primary else {}
+        missing = [message_id for message_id in dict.fromkeys(message_ids) if message_id not in found]
+        if missing:
+            result = await self.db_async_read.execute(select(Message).where(Message.id.in_(missing)))
+            db_messages = result.scalars().all()
+            if self.db.reads_from_primary:
+                await message_cache.set_many_async(db_messages)
+            found.update((db_message.id, db_message) for db_message in db_messages)
+        return found
+
+    def get_message_version(self, message_id: UUID) -> Union[Row, MessageSchema]:
+        # (version, updated_at) for conditional GETs, without loading or serializing the message.
+        # A per-process cache misses other workers' writes, so then the primary decides.
+        if message_cache.coherent:
+            cached = message_cache.get(message_id)
+            if cached is not None:
+                return cached
+            row = self.db_sync_read.execute(version_query(message_id)).first()
+        else:
+            row = self.db_sync.execute(version_query(message_id)).first()
+        self.release_sync()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return row
+
+    async def get_message_version_async(self, message_id: UUID) -> Union[Row, MessageSchema]:
+        if message_cache.coherent:
+            cached = await message_cache.get_async(message_id)
+            if cached is not None:
+                return cached
+            result = await self.db_async_read.execute(version_query(message_id))
+        else:
+            result = await self.db_async.execute(version_query(message_id))
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return row
+
+    async def load_message_async(self, message_id: UUID) -> Message:
+        result = await self.db_async.execute(select(Message).where(Message.id == message_id))
+        db_message = result.scalars().first()
         if db_message is None:
             raise HTTPException(status_code=404, detail="Message not found")
         return db_message
 
-    def update_message(self, message_id: UUID, message_data: MessageBase) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+    def update_message(self, message_id: UUID, message_data: MessageBase, versions: Optional[List[int]] = None) -> Message:
+        statement = update_statement(message_id, message_data, versions)
+        if self.db_sync.get_bind().dialect.update_returning:
+            # UPDATE ... RETURNING: one round trip instead of SELECT, UPDATE and refresh
+            db_message = self.db_sync.execute(
+                statement.returning(Message), execution_options={"synchronize_session": False}
+            ).scalars().first()
+        elif self.db_sync.execute(statement, execution_options={"synchronize_session": False}).rowcount:
+            db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+        else:
+            db_message = None
         if db_message is None:
+            if versions is not None and self.db_sync.get(Message, message_id) is not None:
+                raise HTTPException(status_code=412, detail="Message has been modified")
             raise HTTPException(status_code=404, detail="Message not found")
-        for key, value in message_data.model_dump(exclude_unset=True).items():
-            setattr(db_message, key, value)
         self.db_sync.commit()
-        self.db_sync.refresh(db_message)
+        message_cache.set(db_message)
+        message_events.publish("updated", db_message)
+        return db_message
+
+    async def update_message_async(self, message_id: UUID, message_data: MessageBase, versions: Optional[List[int]] = None) -> Message:
+        statement = update_statement(message_id, message_data, versions)
+        if self.db_async.get_bind().dialect.update_returning:
+            result = await self.db_async.execute(
+                statement.returning(Message), execution_options={"synchronize_session": False}
+            )
+            db_message = result.scalars().first()
+        elif (await self.db_async.execute(statement, execution_options={"synchronize_session": False})).rowcount:
+            db_message = await self.load_message_async(message_id)
+        else:
+            db_message = None
+        if db_message is None:
+            if versions is not None and await self.db_async.get(Message, message_id) is not None:
+                raise HTTPException(status_code=412, detail="Message has been modified")
+            raise HTTPException(status_code=404, detail="Message not found")
+        await self.db_async.commit()
+        await message_cache.set_async(db_message)
+        if self._loader is not None:
+            self._loader.prime(message_id, db_message)
+        await message_events.publish_async("updated", db_message)
         return db_message
 
     def delete_message(self, message_id: UUID) -> Message:
-        db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+        statement = delete(Message).where(Message.id == message_id)
+        if self.db_sync.get_bind().dialect.delete_returning:
+            # DELETE ... RETURNING hands back the deleted row without a SELECT first
+            db_message = self.db_sync.execute(
+                statement.returning(Message), execution_options={"synchronize_session": False}
+            ).scalars().first()
+        else:
+            db_message = self.db_sync.query(Message).filter(Message.id == message_id).first()
+            if db_message is not None:
+                self.db_sync.execute(statement, execution_options={"synchronize_session": False})
         if db_message is None:
             raise HTTPException(status_code=404, detail="Message not found")
-        self.db_sync.delete(db_message)
         self.db_sync.commit()
+        message_cache.invalidate(message_id)
+        message_events.publish("deleted", db_message)
+        return db_message
+
+    async def delete_message_async(self, message_id: UUID) -> Message:
+        statement = delete(Message).where(Message.id == message_id)
+        if self.db_async.get_bind().dialect.delete_returning:
+            result = await self.db_async.execute(
+                statement.returning(Message), execution_options={"synchronize_session": False}
+            )
+            db_message = result.scalars().first()
+        else:
+            db_message = await self.load_message_async(message_id)
+            await self.db_async.execute(statement, execution_options={"synchronize_session": False})
+        if db_message is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        await self.db_async.commit()
+        await message_cache.invalidate_async(message_id)
+        if self._loader is not None:
+            self._loader.prime(message_id, None)
+        await message_events.publish_async("deleted", db_message)
         return db_message
 
-async def create_message_dict_async(db: AsyncSession, data: dict):
-    # If not, insert the new model asynchronously
-    db_data = Message(**data)
-    db.add(db_data)
-    await db.commit()  
-    await db.refresh(db_data)  
-    return db_data
\ No newline at end of file
+async def seed_messages_async(db: AsyncSession, data: List[dict]) -> int:
+    # Seed rows get ids derived from their content, so re-seeding on every boot inserts nothing new
+    now = utc_now()
+    rows = [
+        {"id": uuid.uuid5(SEED_NAMESPACE, raw_data["content"]), "created_at": now, "version": 1, "updated_at": now, **raw_data}
+        for raw_data in data
+    ]
+    if not rows:
+        return 0
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+        result = await db.execute(dialect_insert(Message).values(rows).on_conflict_do_nothing(index_elements=["id"]))
+        inserted = result.rowcount
+    else:
+        result = await db.execute(select(Message.id).where(Message.id.in_([row["id"] for row in rows])))
+        existing_ids = set(result.scalars())
+        missing_rows = [row for row in rows if row["id"] not in existing_ids]
+        if missing_rows:
+            await db.execute(insert(Message), missing_rows)
+        inserted = len(missing_rows)
+    await db.commit()
+    return inserted
+
+def build_message_rows(messages_data: List[MessageCreate]) -> List[dict]:
+    # Ids are generated here so a multi-row INSERT (or COPY) can return them without a read back
+    now = utc_now()
+    return [
+        {"id": uuid.uuid4(), "created_at": now, "version": 1, "updated_at": now, **message_data.model_dump()}
+        for message_data in messages_data
+    ]
+
+async def batched(items: AsyncIterable, size: int) -> AsyncIterator[list]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def import_records(chunks: AsyncIterable[bytes], fmt: TransferFormat) -> AsyncIterator[MessageCreate]:
+    # Messages from a streamed NDJSON or CSV body; ids and timestamps are assigned on insert
+    records = csv_records(chunks) if fmt == "csv" else ndjson_records(chunks)
+    try:
+        async for line_number, record in records:
+            try:
+                yield MessageCreate.model_validate(record)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(map(str, error["loc"]))
+                raise ValueError(f"line {line_number}: {field + ': ' if field else ''}{error['msg']}") from e
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def export_query():
+    return (
+        select(*MESSAGE_COLUMNS)
+        .order_by(Message.created_at, Message.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+
+def version_query(message_id: UUID):
+    return select(Message.version, Message.updated_at).where(Message.id == message_id)
+
+def update_statement(message_id: UUID, message_data: MessageBase, versions: Optional[List[int]] = None):
+    # updated_at is set by the column's onupdate
+    statement = update(Message).where(Message.id == message_id).values(
+        **message_data.model_dump(exclude_unset=True), version=Message.version + 1
+    )
+    if versions is not None:
+        # If-Match: only overwrite the version the client last saw
+        statement = statement.where(Message.version.in_(versions))
+    return statement
+
+def messages_query(skip: int, limit: int, cursor: Optional[str], *entities):
+    query = select(*entities).order_by(Message.created_at, Message.id)
+    if cursor:
+        # Keyset pagination: seek past the cursor on the index instead of scanning `skip` rows
+        query = query.where(after_cursor(cursor))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def estimate_count_query(dialect_name: str):
+    # PostgreSQL keeps a row estimate in pg_class, refreshed by VACUUM and ANALYZE. Until the table has
+    # been analyzed it is -1, or 0 before PostgreSQL 14, so callers only trust positive estimates.
+    # Other databases have nothing as cheap, so they get None.
+    if dialect_name == "postgresql":
+        return text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)").bindparams(
+            table_name=Message.__tablename__
+        )
+    return None
+
+def fts5_query(q: str) -> str:
+    # Quote every term so user input can't use (or break on) FTS5 query syntax; terms are ANDed
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in q.split())
+
+def search_query(dialect_name: str, q: str, skip: int, limit: int, *entities):
+    if not q.strip():
+        return select(*entities).where(false())
+    if dialect_name == "postgresql":
+        ts_query = func.websearch_to_tsquery(literal_column("'english'"), q)
+        vector = content_search_vector()
+        query = select(*entities).where(vector.op("@@")(ts_query)).order_by(
+            func.ts_rank_cd(vector, ts_query).desc(), Message.id
+        )
+    elif dialect_name == "sqlite":
+        # FTS5's hidden rank column is bm25(), lower is better
+        query = (
+            select(*entities)
+            .join(messages_fts, messages_fts.c.id == Message.id)
+            .where(literal_column("messages_fts").op("MATCH")(fts5_query(q)))
+            .order_by(messages_fts.c.rank, Message.id)
+        )
+    else:
+        # No full-text index: unranked substring match
+        query = select(*entities).where(Message.content.contains(q, autoescape=True)).order_by(
+            Message.created_at, Message.id
+        )
+    return query.offset(skip).limit(limit)
+
+def after_cursor(cursor: str):
+    created_at, message_id = decode_cursor(cursor)
+    return or_(
+        Message.created_at > created_at,
+        and_(Message.created_at == created_at, Message.id > message_id),
+    )
+
+def use_copy(dialect_name: str, row_count: int) -> bool:
+    return dialect_name == "postgresql" and row_count >= settings.BULK_COPY_THRESHOLD
+
+def copy_message_rows(db: Session, rows: List[dict]):
+    # COPY ... FROM STDIN on the session's own connection, so it shares the surrounding transaction
+    columns = list(rows[0])
+    cursor = db.connection().connection.dbapi_connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        # Not psycopg2; fall back to a multi-row INSERT
+        cursor.close()
+        db.execute(insert(Message), rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    try:
+        cursor.copy_expert(
+            f"COPY {Message.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+async def copy_message_rows_async(db: AsyncSession, rows: List[dict]):
+    columns = list(rows[0])
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not hasattr(driver_connection, "copy_records_to_table"):
+        # Not asyncpg; fall back to a multi-row INSERT
+        await db.execute(insert(Message), rows)
+        return
+    await driver_connection.copy_records_to_table(
+        Message.__tablename__,
+        records=[tuple(row[column] for column in columns) for row in rows],
+        columns=columns,
+    )
@@ -0,0 +1,25 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+from fastapi import HTTPException
+from backend.fastapi.models import Message
+
+def encode_cursor(created_at: datetime, message_id: UUID) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def next_cursor(messages: List[Message], limit: int) -> Optional[str]:
+    # A short page means there is nothing left to fetch
+    if limit <= 0 or len(messages) < limit:
+        return None
+    last = messages[-1]
+    return encode_cursor(last.created_at, last.id)
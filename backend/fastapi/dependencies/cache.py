@@ -0,0 +1,280 @@
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from starlette.concurrency import run_in_threadpool
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.schemas import MessageSchema
+
+logger = logging.getLogger("uvicorn.error")
+
+class CacheBackend(ABC):
+    """Key/value store behind MessageCache. Values are JSON-compatible dicts."""
+
+    # Backends that do network I/O are called from the threadpool on async paths
+    blocking = False
+    # Shared backends see every worker's writes
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: dict):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        return [self.get(key) for key in keys]
+
+    def set_many(self, values: Dict[str, dict]):
+        for key, value in values.items():
+            self.set(key, value)
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache bounded by entry count and per-entry TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict = OrderedDict()
+        # Sync endpoints reach the cache from threadpool workers
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: dict):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class RedisCache(CacheBackend):
+    """Shared cache for multi-worker deployments. Requires the optional `redis` package.
+
+    Redis errors are logged and count as misses, so an outage slows reads down instead of failing
+    them. A failed delete leaves the old entry until it expires after `ttl` seconds.
+    """
+
+    blocking = True
+    shared = True
+
+    def __init__(self, url: str, ttl: float, prefix: str = "message:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("MESSAGE_CACHE_URL is set but the 'redis' package is not installed") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._redis_error = redis.RedisError
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _failed(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning("Message cache %s failed: %s", operation, error)
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = self._client.get(self.prefix + key)
+        except self._redis_error as e:
+            self._failed("get", e)
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: dict):
+        try:
+            self._client.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+        except self._redis_error as e:
+            self._failed("set", e)
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self.prefix + key)
+        except self._redis_error as e:
+            self._failed("delete", e)
+
+    def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        # One MGET instead of a round trip per key
+        try:
+            raws = self._client.mget([self.prefix + key for key in keys]) if keys else []
+        except self._redis_error as e:
+            self._failed("get_many", e)
+            raws = [None] * len(keys)
+        values = [json.loads(raw) if raw is not None else None for raw in raws]
+        hits = sum(value is not None for value in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def set_many(self, values: Dict[str, dict]):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+        try:
+            pipeline.execute()
+        except self._redis_error as e:
+            self._failed("set_many", e)
+
+    def stats(self) -> dict:
+        # Redis evicts on its own (maxmemory-policy); its counters are in INFO stats
+        return {"backend": "redis", "ttl": self.ttl, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+class MessageCache:
+    """Read-through cache of single messages, stored as serialized MessageSchema dicts."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    @property
+    def coherent(self) -> bool:
+        # Every write reaches this cache: it is shared, or this is the only worker
+        return self.backend.shared or settings.WEB_CONCURRENCY <= 1
+
+    def get(self, message_id: UUID) -> Optional[MessageSchema]:
+        value = self.backend.get(str(message_id))
+        return MessageSchema.model_validate(value) if value is not None else None
+
+    def set(self, message) -> None:
+        value = MessageSchema.model_validate(message).model_dump(mode="json")
+        self.backend.set(str(value["id"]), value)
+
+    def invalidate(self, message_id: UUID):
+        self.backend.delete(str(message_id))
+
+    def get_many(self, message_ids: Iterable[UUID]) -> Dict[UUID, MessageSchema]:
+        message_ids = list(dict.fromkeys(message_ids))
+        values = self.backend.get_many([str(message_id) for message_id in message_ids])
+        return {
+            message_id: MessageSchema.model_validate(value)
+            for message_id, value in zip(message_ids, values)
+            if value is not None
+        }
+
+    def set_many(self, messages: Iterable):
+        values = [MessageSchema.model_validate(message).model_dump(mode="json") for message in messages]
+        if values:
+            self.backend.set_many({str(value["id"]): value for value in values})
+
+    async def get_async(self, message_id: UUID) -> Optional[MessageSchema]:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get, message_id)
+        return self.get(message_id)
+
+    async def set_async(self, message) -> None:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.set, message)
+        self.set(message)
+
+    async def invalidate_async(self, message_id: UUID):
+        if self.backend.blocking:
+            return await run_in_threadpool(self.invalidate, message_id)
+        self.invalidate(message_id)
+
+    async def get_many_async(self, message_ids: Iterable[UUID]) -> Dict[UUID, MessageSchema]:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get_many, message_ids)
+        return self.get_many(message_ids)
+
+    async def set_many_async(self, messages: Iterable):
+        if self.backend.blocking:
+            return await run_in_threadpool(self.set_many, messages)
+        self.set_many(messages)
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+class CountCache:
+    """An exact row count reused for TOTAL_COUNT_TTL seconds, so listing pages rarely pay for COUNT(*)."""
+
+    def __init__(self):
+        self._value: Optional[int] = None
+        self._counted_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[int]:
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._counted_at < settings.TOTAL_COUNT_TTL:
+                return self._value
+            return None
+
+    def set(self, value: int):
+        with self._lock:
+            self._value = value
+            self._counted_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+
+def create_cache_backend() -> CacheBackend:
+    if settings.MESSAGE_CACHE_URL:
+        return RedisCache(settings.MESSAGE_CACHE_URL, settings.MESSAGE_CACHE_TTL)
+    if settings.WEB_CONCURRENCY > 1:
+        # Each worker would keep serving messages other workers have since updated or deleted
+        logger.warning("Message cache off: %d workers and no MESSAGE_CACHE_URL", settings.WEB_CONCURRENCY)
+        return LRUCache(0, settings.MESSAGE_CACHE_TTL)
+    return LRUCache(settings.MESSAGE_CACHE_SIZE, settings.MESSAGE_CACHE_TTL)
+
+message_cache = MessageCache(create_cache_backend())
+message_count_cache = CountCache()
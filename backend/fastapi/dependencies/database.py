@@ -1,30 +1,459 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+import anyio
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 
+from backend.fastapi.core.config import to_async_url
 from backend.fastapi.core.init_settings import global_settings as settings
 
 # Base class for the database models
 Base = declarative_base()
 
-# Synchronous engine and session
-sync_engine = create_engine(settings.DB_URL)
-SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+class PoolWaitStats:
+    """How long checkouts waited on a pool, and how many gave up with a QueuePool timeout."""
 
-# Asynchronous engine and session
-async_engine = create_async_engine(settings.ASYNC_DB_URL, echo=False, future=True)
-AsyncSessionLocal = sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+class InstrumentedPoolMixin:
+    def __init__(self, *args, **kwargs):
+        self.wait_stats = PoolWaitStats()
+        super().__init__(*args, **kwargs)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    if url.startswith("sqlite"):
+        # Sessions may be closed from a different thread than the one that opened them
+        options = {"connect_args": {"check_same_thread": False}}
+        if make_url(url).database in (None, "", ":memory:"):
+            # One shared connection, otherwise every checkout gets its own empty database
+            options["poolclass"] = StaticPool
+            return options
+    else:
+        options = {}
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a writer commits; NORMAL sync is safe under WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_POOL_TIMEOUT * 1000)}")
+    cursor.close()
+
+def configure_sqlite(engine: Engine):
+    if engine.dialect.name == "sqlite" and settings.SQLITE_WAL:
+        event.listen(engine, "connect", set_sqlite_pragmas)
+
+query_logger = logging.getLogger("backend.fastapi.sql")
+
+class QueryStats:
+    """SQL statements run for one request (or one track_queries block)."""
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        # Executions per distinct statement, to spot N+1 queries
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, times: int) -> Dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= times}
+
+# Set per request by QueryStatsMiddleware; the threadpool copies it into sync endpoints
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+_query_trackers: List[QueryStats] = []
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    # Every statement run while the block is open, from any request or thread
+    stats = QueryStats()
+    _query_trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _query_trackers.remove(stats)
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started_at = time.perf_counter()
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "query_started_at", None)
+    if started_at is None:
+        return
+    seconds = time.perf_counter() - started_at
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+    for tracker in _query_trackers:
+        tracker.record(statement, seconds)
+    if 0 < settings.SLOW_QUERY_SECONDS <= seconds:
+        log_slow_query(statement, seconds, stats)
+
+def log_slow_query(statement: str, seconds: float, stats: Optional[QueryStats]):
+    fields = {
+        "duration_ms": round(seconds * 1000, 3),
+        "method": stats.method if stats else None,
+        "path": stats.path if stats else None,
+        "statement": statement,
+    }
+    query_logger.warning(
+        "Slow query (%.1f ms) in %s %s: %s", fields["duration_ms"], fields["method"], fields["path"], statement,
+        extra=fields,
+    )
+
+def log_repeated_queries(stats: QueryStats):
+    # The same statement many times in one request is usually a per-row lookup in a loop
+    for statement, count in stats.repeated(settings.QUERY_REPEAT_WARNING).items():
+        query_logger.warning(
+            "Possible N+1 query, ran %d times in %s %s: %s", count, stats.method, stats.path, statement,
+            extra={"count": count, "method": stats.method, "path": stats.path, "statement": statement},
+        )
+
+def configure_engine(engine: Engine):
+    configure_sqlite(engine)
+    event.listen(engine, "before_cursor_execute", start_query_timer)
+    event.listen(engine, "after_cursor_execute", record_query)
+
+# Engines and their sessionmakers are created on first use, from the settings active then
+_engines: dict = {}
+_engines_lock = threading.Lock()
+
+def get_sync_engine() -> Engine:
+    if "sync" not in _engines:
+        with _engines_lock:
+            if "sync" not in _engines:
+                engine = create_engine(settings.DB_URL, **engine_options(settings.DB_URL))
+                configure_engine(engine)
+                # Ids and timestamps are generated client side, so committed objects stay valid without a reload
+                _engines["sync_sessionmaker"] = sessionmaker(
+                    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+                )
+                _engines["sync"] = engine
+    return _engines["sync"]
+
+def get_async_engine() -> AsyncEngine:
+    if "async" not in _engines:
+        with _engines_lock:
+            if "async" not in _engines:
+                engine = create_async_engine(
+                    settings.ASYNC_DB_URL, echo=False, future=True,
+                    **engine_options(settings.ASYNC_DB_URL, is_async=True),
+                )
+                configure_engine(engine.sync_engine)
+                _engines["async_sessionmaker"] = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+                _engines["async"] = engine
+    return _engines["async"]
+
+def get_sync_sessionmaker() -> sessionmaker:
+    get_sync_engine()
+    return _engines["sync_sessionmaker"]
+
+def get_async_sessionmaker() -> sessionmaker:
+    get_async_engine()
+    return _engines["async_sessionmaker"]
+
+def get_close_limiter() -> anyio.CapacityLimiter:
+    # Shared by every request, so closing sessions uses at most one thread per pooled connection
+    if "close_limiter" not in _engines:
+        with _engines_lock:
+            if "close_limiter" not in _engines:
+                _engines["close_limiter"] = anyio.CapacityLimiter(settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    return _engines["close_limiter"]
+
+def get_replica_sessionmakers(is_async: bool = False) -> List[sessionmaker]:
+    key = "async_replicas" if is_async else "sync_replicas"
+    if key not in _engines:
+        with _engines_lock:
+            if key not in _engines:
+                sessionmakers = []
+                for url in settings.REPLICA_URLS:
+                    if is_async:
+                        url = to_async_url(url)
+                        engine = create_async_engine(url, future=True, **engine_options(url, is_async=True))
+                        configure_engine(engine.sync_engine)
+                        sessionmakers.append(sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession))
+                    else:
+                        engine = create_engine(url, **engine_options(url))
+                        configure_engine(engine)
+                        sessionmakers.append(sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine))
+                _engines[key] = sessionmakers
+    return _engines[key]
+
+_replica_turn = itertools.count()
+
+def get_replica_sessionmaker(is_async: bool = False) -> Optional[sessionmaker]:
+    # Round-robin over the replicas; None when there are none
+    sessionmakers = get_replica_sessionmakers(is_async)
+    if not sessionmakers:
+        return None
+    return sessionmakers[next(_replica_turn) % len(sessionmakers)]
+
+def created_engines():
+    # Every engine built so far, primary and replicas, with whether it is async
+    if "sync" in _engines:
+        yield _engines["sync"], False
+    if "async" in _engines:
+        yield _engines["async"], True
+    for maker in _engines.get("sync_replicas", []):
+        yield maker.kw["bind"], False
+    for maker in _engines.get("async_replicas", []):
+        yield maker.kw["bind"], True
+
+# Async engines dropped by reset_engines. Closing their connections needs an event loop, so the
+# next lifespan startup or shutdown does it in dispose_retired_engines.
+_retired_async_engines: List[AsyncEngine] = []
+
+def reset_engines():
+    # Drop the engines so the next use builds them from the current settings
+    with _engines_lock:
+        for engine, is_async in list(created_engines()):
+            if is_async:
+                _retired_async_engines.append(engine)
+            else:
+                engine.dispose()
+        _engines.clear()
+
+async def dispose_retired_engines():
+    while _retired_async_engines:
+        engine = _retired_async_engines.pop()
+        try:
+            await engine.dispose()
+        except Exception:
+            # Connections bound to an event loop that has since closed can only be dropped
+            engine.sync_engine.dispose(close=False)
+
+def reset_engines_after_fork():
+    # A forked child shares the parent's pooled sockets; drop them without closing them (which
+    # would break the parent's connections) and build fresh engines on first use
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    for engine, is_async in list(created_engines()):
+        (engine.sync_engine if is_async else engine).dispose(close=False)
+    _engines.clear()
+    for engine in _retired_async_engines:
+        engine.sync_engine.dispose(close=False)
+    _retired_async_engines.clear()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_engines_after_fork)
+
+async def dispose_engines():
+    # Close pooled connections on shutdown; the engines stay usable and reconnect on demand
+    await dispose_retired_engines()
+    for engine, is_async in list(created_engines()):
+        if is_async:
+            await engine.dispose()
+        else:
+            await anyio.to_thread.run_sync(engine.dispose)
+
+def __getattr__(name):
+    # The module-level names used before engines were lazy
+    lazy_attributes = {
+        "sync_engine": get_sync_engine,
+        "async_engine": get_async_engine,
+        "SyncSessionLocal": get_sync_sessionmaker,
+        "AsyncSessionLocal": get_async_sessionmaker,
+    }
+    if name in lazy_attributes:
+        return lazy_attributes[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    if isinstance(pool, InstrumentedPoolMixin):
+        status.update(pool.wait_stats.as_dict())
+    return status
 
 def init_db():
-    Base.metadata.create_all(bind=sync_engine)
+    Base.metadata.create_all(bind=get_sync_engine())
+
+async def init_db_async():
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 def get_sync_db():
-    db = SyncSessionLocal()
+    db = get_sync_sessionmaker()()
     try:
         yield db
     finally:
         db.close()
 
 async def get_async_db():
-    async with AsyncSessionLocal() as session:
+    async with get_async_sessionmaker()() as session:
         yield session
+
+# Set after a write when replicas are configured, so the client's next reads see it
+READ_PRIMARY_COOKIE = "read_primary"
+
+class LazySessions:
+    """Per-request holder that opens the sync or async session only when it is first used.
+
+    `sync_session` and `async_session` are on the primary. The `*_read_session`s are on a
+    replica, unless there are none, `read_primary` is set, or a commit has happened here.
+    """
+
+    def __init__(self, read_primary: bool = False, on_write: Optional[Callable[[], None]] = None):
+        self.read_primary = read_primary
+        self.on_write = on_write
+        self._sync_session: Optional[Session] = None
+        self._async_session: Optional[AsyncSession] = None
+        self._sync_read_session: Optional[Session] = None
+        self._async_read_session: Optional[AsyncSession] = None
+
+    @property
+    def sync_session(self) -> Session:
+        if self._sync_session is None:
+            self._sync_session = get_sync_sessionmaker()()
+            event.listen(self._sync_session, "after_commit", self.mark_write)
+        return self._sync_session
+
+    @property
+    def async_session(self) -> AsyncSession:
+        if self._async_session is None:
+            self._async_session = get_async_sessionmaker()()
+            event.listen(self._async_session.sync_session, "after_commit", self.mark_write)
+        return self._async_session
+
+    @property
+    def reads_from_primary(self) -> bool:
+        # Rows read now are current, so they may go into the shared message cache
+        return self.read_primary or not settings.REPLICA_URLS
+
+    def read_sessionmaker(self, is_async: bool = False) -> Optional[sessionmaker]:
+        # The replica to read from, or None to read from the primary
+        if self.read_primary:
+            return None
+        return get_replica_sessionmaker(is_async)
+
+    @property
+    def sync_read_session(self) -> Session:
+        if self.read_primary:
+            return self.sync_session
+        if self._sync_read_session is None:
+            replica = self.read_sessionmaker()
+            if replica is None:
+                return self.sync_session
+            self._sync_read_session = replica()
+        return self._sync_read_session
+
+    @property
+    def async_read_session(self) -> AsyncSession:
+        if self.read_primary:
+            return self.async_session
+        if self._async_read_session is None:
+            replica = self.read_sessionmaker(is_async=True)
+            if replica is None:
+                return self.async_session
+            self._async_read_session = replica()
+        return self._async_read_session
+
+    def mark_write(self, *args):
+        # Read your writes: the rest of this request reads from the primary
+        self.read_primary = True
+        if self.on_write is not None:
+            self.on_write()
+
+    def close_sync(self):
+        for session in (self._sync_session, self._sync_read_session):
+            if session is not None:
+                session.close()
+
+    async def close(self):
+        if self._sync_session is not None or self._sync_read_session is not None:
+            # Closing may roll back on the connection, so keep it off the event loop. Its own
+            # limiter avoids waiting behind a full threadpool, as FastAPI does for sync dependencies.
+            await anyio.to_thread.run_sync(self.close_sync, limiter=get_close_limiter())
+        for session in (self._async_session, self._async_read_session):
+            if session is not None:
+                await session.close()
+
+async def get_lazy_db(request: Request, response: Response):
+    read_primary = request.headers.get("X-Read-Primary") == "1" or READ_PRIMARY_COOKIE in request.cookies
+
+    def on_write():
+        if settings.REPLICA_URLS:
+            response.set_cookie(
+                READ_PRIMARY_COOKIE, "1", max_age=settings.READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax"
+            )
+
+    sessions = LazySessions(read_primary, on_write)
+    try:
+        yield sessions
+    finally:
+        await sessions.close()
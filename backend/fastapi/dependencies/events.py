@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from starlette.concurrency import run_in_threadpool
+from backend.fastapi.core.init_settings import global_settings as settings
+from backend.fastapi.core.serialization import dumps, loads
+from backend.fastapi.schemas import MessageSchema
+
+logger = logging.getLogger("uvicorn.error")
+
+class Subscription:
+    """Bounded queue of events for one subscriber. When it is full the oldest event is dropped,
+    so a slow client never holds up publishers; it is told how many events it missed instead."""
+
+    def __init__(self, max_size: int):
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+        self._events: deque = deque(maxlen=max_size)
+        self._missed = 0
+        self._ready = asyncio.Event()
+
+    def put(self, event: dict):
+        # Runs on the subscriber's event loop
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+            self._missed += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self) -> dict:
+        while not self._events:
+            self._ready.clear()
+            await self._ready.wait()
+        if self._missed:
+            missed, self._missed = self._missed, 0
+            return {"type": "dropped", "count": missed}
+        return self._events.popleft()
+
+class EventBroker(ABC):
+    """Fans message events out to the subscribers of this process."""
+
+    # Brokers that do network I/O are called from the threadpool on async paths
+    blocking = False
+
+    @abstractmethod
+    def has_subscribers(self) -> bool:
+        ...
+
+    @abstractmethod
+    def publish(self, event: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+class MemoryEventBroker(EventBroker):
+    """In-process broker; events only reach subscribers connected to the same worker."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self._subscriptions = set()
+        self._dropped = 0
+        # Sync endpoints publish from threadpool workers
+        self._lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def publish(self, event: dict):
+        with self._lock:
+            self.published += 1
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                # Delivered on the subscriber's loop, whichever thread is publishing
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(subscription)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.discard(subscription)
+                self._dropped += subscription.dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return {
+            "backend": "memory",
+            "subscribers": len(subscriptions),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "dropped": self._dropped + sum(subscription.dropped for subscription in subscriptions),
+        }
+
+class RedisEventBroker(EventBroker):
+    """Shares events across workers over Redis pub/sub. Requires the optional `redis` package.
+
+    Every worker listens on the channel from one background thread and hands the events to
+    its own MemoryEventBroker, so each event crosses the network once per worker. The listener
+    reconnects after Redis errors; events published while it is away are lost.
+    """
+
+    blocking = True
+    # Backoff between reconnects, doubling up to the maximum
+    RECONNECT_SECONDS = 0.1
+    MAX_RECONNECT_SECONDS = 30.0
+
+    def __init__(self, url: str, queue_size: int, channel: str = "messages:events"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("MESSAGE_EVENTS_URL is set but the 'redis' package is not installed") from e
+        self._client = redis.Redis.from_url(url)
+        self._redis_error = redis.RedisError
+        self.channel = channel
+        self._local = MemoryEventBroker(queue_size)
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        # Other workers may have subscribers
+        return True
+
+    def publish(self, event: dict):
+        try:
+            self._client.publish(self.channel, dumps(event))
+        except self._redis_error as e:
+            # Events follow committed writes; failing the request would only make clients retry them
+            logger.warning("Message event not published: %s", e)
+
+    def subscribe(self) -> Subscription:
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="message-events", daemon=True)
+                self._listener.start()
+        return self._local.subscribe()
+
+    def unsubscribe(self, subscription: Subscription):
+        self._local.unsubscribe(subscription)
+
+    def _listen(self):
+        delay = self.RECONNECT_SECONDS
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                delay = self.RECONNECT_SECONDS
+                for message in pubsub.listen():
+                    self._local.publish(loads(message["data"]))
+            except self._redis_error as e:
+                logger.warning("Message events listener lost Redis, reconnecting in %.1f s: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.MAX_RECONNECT_SECONDS)
+            finally:
+                pubsub.close()
+
+    def stats(self) -> dict:
+        return {**self._local.stats(), "backend": "redis", "channel": self.channel}
+
+def message_event(event_type: str, message) -> dict:
+    return {"type": event_type, "message": MessageSchema.model_validate(message).model_dump(mode="json")}
+
+class MessageEvents:
+    """Create, update and delete events published by MessageService."""
+
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+
+    def publish(self, event_type: str, *messages, **fields):
+        # One event per message, or a single event carrying `fields` when there are none.
+        # Events are only built when someone may be listening.
+        if not self.broker.has_subscribers():
+            return
+        if not messages:
+            self.broker.publish({"type": event_type, **fields})
+        for message in messages:
+            self.broker.publish(message_event(event_type, message))
+
+    async def publish_async(self, event_type: str, *messages, **fields):
+        if self.broker.blocking:
+            return await run_in_threadpool(self.publish, event_type, *messages, **fields)
+        self.publish(event_type, *messages, **fields)
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[Subscription]:
+        subscription = self.broker.subscribe()
+        try:
+            yield subscription
+        finally:
+            self.broker.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return self.broker.stats()
+
+def create_event_broker() -> EventBroker:
+    if settings.MESSAGE_EVENTS_URL:
+        return RedisEventBroker(settings.MESSAGE_EVENTS_URL, settings.MESSAGE_EVENTS_QUEUE_SIZE)
+    return MemoryEventBroker(settings.MESSAGE_EVENTS_QUEUE_SIZE)
+
+message_events = MessageEvents(create_event_broker())
@@ -1,18 +1,202 @@
-from fastapi import Depends, HTTPException, Request
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-import aioredis
-
-async def init_rate_limiter():
-    redis = await aioredis.create_redis_pool("redis://localhost")
-    await FastAPILimiter.init(redis)
-
-def get_rate_limiter():
-    return RateLimiter(times=5, seconds=60)  # 5 requests per minute
-
-async def check_ip_rate_limit(request: Request, limiter: RateLimiter = Depends(get_rate_limiter)):
-    ip = request.client.host
-    try:
-        await limiter(request)
-    except Exception as e:
-        raise HTTPException(status_code=429, detail=f"Rate limit exceeded for IP: {ip}")
+import logging
+import math
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request, WebSocket, WebSocketException, status
+from starlette.requests import HTTPConnection
+from starlette.concurrency import run_in_threadpool
+from backend.fastapi.core.init_settings import global_settings as settings
+
+logger = logging.getLogger("uvicorn.error")
+
+class RateLimitBackend(ABC):
+    """Counts hits per key. `hit` returns 0 when the request is allowed, else seconds until it would be."""
+
+    # Backends that do network I/O are called from the threadpool
+    blocking = False
+
+    @abstractmethod
+    def hit(self, key: str, times: int, seconds: float) -> float:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+class TokenBucketShard:
+    """One lock and one OrderedDict of buckets, ordered from least to most recently used."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.evictions = 0
+        # key -> (tokens, updated_at, full_at)
+        self.buckets: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key: str, times: int, seconds: float, now: float) -> float:
+        rate = times / seconds
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                tokens = float(times)
+            else:
+                tokens, updated_at, _ = bucket
+                tokens = min(float(times), tokens + (now - updated_at) * rate)
+                self.buckets.move_to_end(key)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now, now + (times - tokens) / rate)
+            self.evict(now)
+        return retry_after
+
+    def evict(self, now: float):
+        # A bucket that has refilled is the same as no bucket, so idle keys can go
+        buckets = self.buckets
+        while buckets:
+            key, (_, _, full_at) = next(iter(buckets.items()))
+            if full_at > now and len(buckets) <= self.max_keys:
+                break
+            del buckets[key]
+            self.evictions += 1
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """In-process token buckets, sharded to keep lock contention low under many clients."""
+
+    def __init__(self, shards: int = 16, max_keys: int = 100000):
+        self.shards = [TokenBucketShard(max(1, max_keys // shards)) for _ in range(shards)]
+
+    def hit(self, key: str, times: int, seconds: float) -> float:
+        shard = self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+        return shard.hit(key, times, seconds, time.monotonic())
+
+    def clear(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.buckets.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "shards": len(self.shards),
+            "keys": sum(len(shard.buckets) for shard in self.shards),
+            "max_keys": sum(shard.max_keys for shard in self.shards),
+            "evictions": sum(shard.evictions for shard in self.shards),
+        }
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Fixed-window counters shared by every worker. Requires the optional `redis` package.
+
+    Redis errors are logged and the request is allowed, so an outage lifts the limits instead of
+    failing every limited route.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RATE_LIMIT_URL is set but the 'redis' package is not installed") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._redis_error = redis.RedisError
+        self.prefix = prefix
+        self.errors = 0
+
+    def hit(self, key: str, times: int, seconds: float) -> float:
+        window_ms = int(seconds * 1000)
+        now_ms = int(time.time() * 1000)
+        window = now_ms // window_ms
+        window_end_ms = (window + 1) * window_ms
+        redis_key = f"{self.prefix}{key}:{window}"
+        pipeline = self._client.pipeline()
+        pipeline.incr(redis_key)
+        # The same absolute expiry on every hit, so the key goes when its window ends
+        pipeline.pexpireat(redis_key, window_end_ms)
+        try:
+            count, _ = pipeline.execute()
+        except self._redis_error as e:
+            self.errors += 1
+            logger.warning("Rate limit check failed, allowing the request: %s", e)
+            return 0.0
+        if count <= times:
+            return 0.0
+        return max(window_end_ms - now_ms, 1) / 1000
+
+    def stats(self) -> dict:
+        # Keys expire with their window in Redis
+        return {"backend": "redis", "errors": self.errors}
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_URL:
+        return RedisRateLimitBackend(settings.RATE_LIMIT_URL)
+    return MemoryRateLimitBackend(settings.RATE_LIMIT_SHARDS, settings.RATE_LIMIT_MAX_KEYS)
+
+rate_limit_backend = create_rate_limit_backend()
+
+def client_id(connection: HTTPConnection) -> str:
+    return connection.client.host if connection.client else "unknown"
+
+def route_key(connection: HTTPConnection, method: str, times: int, seconds: float) -> str:
+    # Keyed by the route template, so /messages/{message_id} is one route for every id
+    route = connection.scope.get("route")
+    path = route.path if route is not None else connection.url.path
+    return f"route:{method}:{path}:{times}/{seconds}:{client_id(connection)}"
+
+async def get_retry_after(key: str, times: int, seconds: float) -> float:
+    if rate_limit_backend.blocking:
+        return await run_in_threadpool(rate_limit_backend.hit, key, times, seconds)
+    return rate_limit_backend.hit(key, times, seconds)
+
+async def hit(key: str, times: int, seconds: float):
+    retry_after = await get_retry_after(key, times, seconds)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+class RateLimiter:
+    """Dependency allowing each client `times` requests per `seconds` on the route it guards.
+
+    Without arguments it applies RATE_LIMIT_ROUTE_TIMES per RATE_LIMIT_SECONDS.
+    """
+
+    def __init__(self, times: Optional[int] = None, seconds: Optional[float] = None):
+        self.times = times
+        self.seconds = seconds
+
+    async def __call__(self, request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        times = self.times or settings.RATE_LIMIT_ROUTE_TIMES
+        seconds = self.seconds or settings.RATE_LIMIT_SECONDS
+        await hit(route_key(request, request.method, times, seconds), times, seconds)
+
+async def check_ip_rate_limit(request: Request):
+    # Per-client limit shared by every route it guards
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    await hit(f"client:{client_id(request)}", settings.RATE_LIMIT_CLIENT_TIMES, settings.RATE_LIMIT_SECONDS)
+
+async def check_websocket_rate_limit(websocket: WebSocket):
+    # The limits check_ip_rate_limit and RateLimiter() apply to HTTP routes, checked before the
+    # handshake is accepted. Over either one, the connection is refused with 1008.
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    times, seconds = settings.RATE_LIMIT_ROUTE_TIMES, settings.RATE_LIMIT_SECONDS
+    limits = (
+        (f"client:{client_id(websocket)}", settings.RATE_LIMIT_CLIENT_TIMES, seconds),
+        (route_key(websocket, "WS", times, seconds), times, seconds),
+    )
+    for key, limit_times, limit_seconds in limits:
+        if await get_retry_after(key, limit_times, limit_seconds):
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Rate limit exceeded")
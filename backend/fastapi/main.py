@@ -1,32 +1,63 @@
-import os
-import uvicorn
-from fastapi import FastAPI
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from backend.fastapi.core.init_settings import args
-from backend.fastapi.core.middleware import setup_cors, setup_session, add_doc_protect
-from backend.fastapi.core.lifespan import lifespan
-from backend.fastapi.core.routers import setup_routers
-
-# Initiate a FastAPI App.
-app = FastAPI(lifespan=lifespan)
-
-# Frontend
-templates = Jinja2Templates(directory="frontend/login/templates")
-app.mount("/static", StaticFiles(directory="frontend/login/static"), name="static")
-
-# Set Middleware
-setup_cors(app)
-add_doc_protect(app)
-setup_session(app)
-
-# Setup Routers
-setup_routers(app)
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+    from backend.fastapi.core.config import Settings
+
+# Importing this module is cheap: FastAPI, the database engines, templates and routers are
+# only loaded or built by create_app, and `app` is created on first access.
+
+def apply_settings(settings: "Settings"):
+    # Swap the process-wide settings and rebuild everything that was derived from the old ones
+    from backend.fastapi.core.init_settings import configure_settings
+    from backend.fastapi.dependencies import rate_limiter
+    from backend.fastapi.dependencies.cache import create_cache_backend, message_cache
+    from backend.fastapi.dependencies.events import create_event_broker, message_events
+    from backend.fastapi.dependencies.database import reset_engines
+
+    configure_settings(settings)
+    reset_engines()
+    message_cache.backend = create_cache_backend()
+    message_events.broker = create_event_broker()
+    rate_limiter.rate_limit_backend = rate_limiter.create_rate_limit_backend()
+
+def create_app(settings: Optional["Settings"] = None) -> "FastAPI":
+    """Build the FastAPI app, with `settings` replacing the process-wide settings when given."""
+    from fastapi import FastAPI
+    from backend.fastapi.core.lifespan import lifespan
+    from backend.fastapi.core.middleware import setup_cors, setup_session, add_doc_protect, setup_query_stats, setup_compression, setup_metrics
+    from backend.fastapi.core.static import PrecompressedStaticFiles, static_directory
+    from backend.fastapi.core.routers import setup_routers
+
+    if settings is not None:
+        apply_settings(settings)
+
+    # Initiate a FastAPI App.
+    app = FastAPI(lifespan=lifespan)
+
+    # Frontend; served from the static build when there is one, which is never made here
+    app.mount("/static", PrecompressedStaticFiles(directory=static_directory()), name="static")
+
+    # Set Middleware
+    setup_cors(app)
+    add_doc_protect(app)
+    setup_session(app)
+    setup_query_stats(app)
+    setup_compression(app)
+    setup_metrics(app)
+
+    # Setup Routers
+    setup_routers(app)
+    return app
+
+def __getattr__(name):
+    # `backend.fastapi.main:app` (uvicorn, tests) builds the default app once, on first access
+    if name == "app":
+        app = create_app()
+        globals()["app"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    uvicorn.run(
-        app="backend.fastapi.main:app",
-        host = args.host,
-        port=int(os.getenv("PORT", 5000)),
-        reload=args.mode == "dev"
-    )
\ No newline at end of file
+    from backend.fastapi.server import run
+    run()
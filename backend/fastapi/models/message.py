@@ -1,14 +1,105 @@
 import uuid
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, event, func, inspect, literal_column, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID, ENUM
 from backend.fastapi.dependencies.database import Base
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
 class Message(Base):
     __tablename__ = "messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     content = Column(String)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    # Bumped by every update; the message's ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now, onupdate=utc_now)
+
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id) in order
+        Index("ix_messages_created_at_id", "created_at", "id"),
+        # Full-text search on PostgreSQL, over the same expression as content_search_vector()
+        Index(
+            "ix_messages_content_fts",
+            func.to_tsvector(literal_column("'english'"), content),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     def __repr__(self):
-        return f"<Message(id={self.id}, content={self.content})>"
\ No newline at end of file
+        return f"<Message(id={self.id}, content={self.content})>"
+
+def content_search_vector():
+    # Must match ix_messages_content_fts for PostgreSQL to use the index
+    return func.to_tsvector(literal_column("'english'"), Message.content)
+
+# Columns added after the messages table first shipped, with the value existing rows get.
+# create_all never alters a table, so add_missing_columns adds them to older databases.
+ADDED_COLUMNS = {
+    "created_at": utc_now,
+    "version": lambda: 1,
+    "updated_at": utc_now,
+}
+
+@event.listens_for(Base.metadata, "after_create")
+def add_missing_columns(target, connection, **kw):
+    # Runs on every create_all, before the search index; a no-op once the columns are there
+    table = Message.__table__
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    missing = [name for name in ADDED_COLUMNS if name not in existing]
+    if not missing:
+        return
+    preparer = connection.dialect.identifier_preparer
+    for name in missing:
+        column_type = table.c[name].type.compile(dialect=connection.dialect)
+        # Nullable at first, since SQLite can only add NOT NULL columns with a constant default
+        connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(name)} {column_type}")
+    connection.execute(update(table).values({name: ADDED_COLUMNS[name]() for name in missing}))
+    if connection.dialect.name == "postgresql":
+        for name in missing:
+            connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.quote(name)} SET NOT NULL")
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+# Full-text search on SQLite: an FTS5 index over messages.content, kept in sync by triggers.
+# Rows are tied to their message by id, stored unindexed, rather than by the implicit rowid,
+# which VACUUM may renumber. Deletes and updates find their row by scanning the index.
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(id UNINDEXED, content)",
+    """CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(id, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_fts WHERE id = old.id;
+    END""",
+    """CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        UPDATE messages_fts SET content = new.content WHERE id = old.id;
+    END""",
+    # Index whatever was there before the search table existed
+    "INSERT INTO messages_fts(id, content) SELECT id, content FROM messages",
+)
+
+# The earlier index, keyed by rowid, which databases created before it changed still have
+SQLITE_ROWID_SEARCH_DROP = (
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    "DROP TABLE messages_fts",
+)
+
+@event.listens_for(Base.metadata, "after_create")
+def create_sqlite_search_index(target, connection, **kw):
+    # Runs on every create_all, so databases created before search existed get the index too
+    if connection.dialect.name != "sqlite":
+        return
+    existing = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'messages_fts'").scalar()
+    if existing is not None:
+        if "content_rowid" not in existing:
+            return
+        for statement in SQLITE_ROWID_SEARCH_DROP:
+            connection.exec_driver_sql(statement)
+    for statement in SQLITE_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
@@ -1 +1 @@
-from backend.fastapi.schemas.message import MessageBase, MessageCreate, MessageSchema
\ No newline at end of file
+from backend.fastapi.schemas.message import MessageBase, MessageCreate, MessageSchema, MessageBulkResponse, MessageBatchGetResponse, MessageImportResponse
\ No newline at end of file
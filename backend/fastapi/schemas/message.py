@@ -1,4 +1,6 @@
 from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import List, Optional
 from uuid import UUID
 
 class MessageBase(BaseModel):
@@ -9,5 +11,19 @@ class MessageCreate(MessageBase):
 
 class MessageSchema(MessageBase):
     id: UUID
+    created_at: datetime
+    version: int
+    updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageBulkResponse(BaseModel):
+    ids: List[UUID]
+
+class MessageBatchGetResponse(BaseModel):
+    # In the order requested, with null for ids that were not found
+    messages: List[Optional[MessageSchema]]
+    missing: List[UUID]
+
+class MessageImportResponse(BaseModel):
+    imported: int
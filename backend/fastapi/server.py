@@ -0,0 +1,68 @@
+import argparse
+import importlib.util
+import logging
+import os
+from typing import List, Optional, Sequence
+
+APP = "backend.fastapi.main:app"
+
+logger = logging.getLogger("uvicorn.error")
+
+def parse_args(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["dev", "prod"], default="dev", help="Set the running mode")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Set the host")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)), help="Set the port")
+    parser.add_argument("--workers", type=int, help="Worker processes in prod mode (default: WEB_CONCURRENCY)")
+    return parser.parse_args(argv)
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+def server_options(args, settings) -> dict:
+    if args.mode == "dev":
+        # One reloading process
+        return {"host": args.host, "port": args.port, "reload": True}
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers or settings.WEB_CONCURRENCY,
+        "loop": event_loop(),
+        "http": http_protocol(),
+        # On SIGTERM stop accepting, let in-flight requests finish, then run the lifespan shutdown
+        "timeout_graceful_shutdown": settings.SHUTDOWN_TIMEOUT,
+    }
+
+def shared_state_warnings(settings, workers: int) -> List[str]:
+    # State kept per process, which several workers each have their own copy of
+    if workers <= 1:
+        return []
+    warnings = []
+    if settings.RATE_LIMIT_ENABLED and not settings.RATE_LIMIT_URL:
+        warnings.append("RATE_LIMIT_URL is not set, so each worker allows the full rate limit")
+    if not settings.MESSAGE_EVENTS_URL:
+        warnings.append("MESSAGE_EVENTS_URL is not set, so /messages/stream and /messages/ws miss other workers' writes")
+    return warnings
+
+def run(argv: Optional[Sequence[str]] = None):
+    import uvicorn
+    from backend.fastapi.core.config import get_settings
+
+    args = parse_args(argv)
+    settings = get_settings(args.mode)
+    options = server_options(args, settings)
+    workers = options.get("workers", 1)
+    # Like the message cache, which turns itself off, the rate limits and the feed carry on per worker
+    for warning in shared_state_warnings(settings, workers):
+        logger.warning("%d workers: %s", workers, warning)
+    if settings.STATIC_BUILD_ON_STARTUP:
+        # Once, before any worker mounts the static files
+        from backend.fastapi.core.static import prepare_static
+        prepare_static()
+    # Workers import the app in fresh processes, which pick these up from the environment
+    os.environ["ENV_MODE"] = args.mode
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run(APP, **options)
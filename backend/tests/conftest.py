@@ -0,0 +1,52 @@
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from backend.fastapi.dependencies.database import get_async_engine, get_sync_engine, init_db, track_queries
+
+@pytest.fixture(scope="session", autouse=True)
+def setup_database():
+    # The test clients don't run the app lifespan, so create the tables up front
+    init_db()
+
+@pytest.fixture
+def pool_checkouts():
+    # Count connections checked out of each engine's pool while the test runs
+    counts = {"sync": 0, "async": 0}
+
+    def count_sync(*args):
+        counts["sync"] += 1
+
+    def count_async(*args):
+        counts["async"] += 1
+
+    sync_engine, async_engine = get_sync_engine(), get_async_engine().sync_engine
+    event.listen(sync_engine, "checkout", count_sync)
+    event.listen(async_engine, "checkout", count_async)
+    yield counts
+    event.remove(sync_engine, "checkout", count_sync)
+    event.remove(async_engine, "checkout", count_async)
+
+@pytest.fixture
+def sync_statements():
+    # Collect the SQL statements the sync engine executes while the test runs
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_engine = get_sync_engine()
+    event.listen(sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(sync_engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def query_budget():
+    # `with query_budget(n): ...` fails the test when the block runs more than n SQL statements
+    @contextmanager
+    def budget(max_queries: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= max_queries, (
+            f"{stats.count} queries over a budget of {max_queries}:\n" + "\n".join(stats.statements)
+        )
+    return budget
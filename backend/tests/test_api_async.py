@@ -4,6 +4,7 @@ import asyncio
 from httpx import ASGITransport, AsyncClient
 from fastapi import status
 from backend.fastapi.main import app
+from backend.fastapi.dependencies.cache import message_cache
 from backend.fastapi.core.init_settings import global_settings
 
 # Mock data for creating a message
@@ -41,3 +42,145 @@ async def test_create_message_async(async_client):
         assert isinstance(uuid_obj, uuid.UUID)
     except ValueError:
         pytest.fail("Invalid UUID format returned in the response.")
+
+@pytest.mark.anyio
+async def test_create_messages_bulk_async(async_client):
+    bulk_data = [{"content": f"Bulk message {i} async"} for i in range(5)]
+
+    # Send a POST request with several messages to the async bulk endpoint
+    response = await async_client.post("/api/v1/messages/bulk/async", json=bulk_data)
+
+    # Verify that the request was successful and returned valid UUIDs
+    assert response.status_code == status.HTTP_201_CREATED
+    ids = response.json()["ids"]
+    assert len(ids) == len(bulk_data)
+    assert len({uuid.UUID(message_id) for message_id in ids}) == len(bulk_data)
+
+@pytest.mark.anyio
+async def test_get_messages_async(async_client):
+    # Create a sample message to ensure there's at least one message
+    await async_client.post("/api/v1/messages/async", json=valid_message_data)
+
+    # Send a GET request to the async list endpoint
+    response = await async_client.get("/api/v1/messages/async")
+
+    # Verify that the request was successful and returned a list of messages
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert isinstance(response_data, list)
+    assert len(response_data) > 0
+
+@pytest.mark.anyio
+async def test_get_message_async(async_client):
+    # Create a sample message
+    create_response = await async_client.post("/api/v1/messages/async", json=valid_message_data)
+    message_id = create_response.json()["id"]
+
+    # Send a GET request to retrieve the specific message
+    response = await async_client.get(f"/api/v1/messages/{message_id}/async")
+
+    # Verify that the response data matches the created message
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert response_data["id"] == message_id
+    assert response_data["content"] == valid_message_data["content"]
+
+@pytest.mark.anyio
+async def test_update_message_async(async_client):
+    # Create a sample message
+    create_response = await async_client.post("/api/v1/messages/async", json=valid_message_data)
+    message_id = create_response.json()["id"]
+
+    # Update the message content
+    updated_data = {
+        "content": "Updated content async"
+    }
+    response = await async_client.put(f"/api/v1/messages/{message_id}/async", json=updated_data)
+
+    # Verify that the content was updated
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["content"] == updated_data["content"]
+
+@pytest.mark.anyio
+async def test_delete_message_async(async_client):
+    # Create a sample message
+    create_response = await async_client.post("/api/v1/messages/async", json=valid_message_data)
+    message_id = create_response.json()["id"]
+
+    # Send a DELETE request to remove the message
+    delete_response = await async_client.delete(f"/api/v1/messages/{message_id}/async")
+    assert delete_response.status_code == status.HTTP_200_OK
+
+    # Verify that the message no longer exists on either engine
+    get_response = await async_client.get(f"/api/v1/messages/{message_id}/async")
+    assert get_response.status_code == status.HTTP_404_NOT_FOUND
+    get_response = await async_client.get(f"/api/v1/messages/{message_id}/sync")
+    assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.anyio
+async def test_get_message_async_checks_out_one_async_connection(async_client, pool_checkouts):
+    # Create a sample message
+    create_response = await async_client.post("/api/v1/messages/async", json=valid_message_data)
+    message_id = create_response.json()["id"]
+    message_cache.invalidate(message_id)
+    pool_checkouts.update({"sync": 0, "async": 0})
+
+    # An uncached async read should only ever touch the async pool, once
+    response = await async_client.get(f"/api/v1/messages/{message_id}/async")
+    assert response.status_code == status.HTTP_200_OK
+    assert pool_checkouts == {"sync": 0, "async": 1}
+
+@pytest.mark.anyio
+async def test_create_message_async_group_commit(async_client, monkeypatch):
+    monkeypatch.setattr(global_settings, "WRITE_BATCH_ENABLED", True)
+
+    # Send concurrent creates so they share a batch
+    responses = await asyncio.gather(*(
+        async_client.post("/api/v1/messages/async", json={"content": f"Batched message {i}"})
+        for i in range(20)
+    ))
+
+    # Verify that every caller got its own message back
+    assert all(response.status_code == status.HTTP_201_CREATED for response in responses)
+    ids = [response.json()["id"] for response in responses]
+    assert len(set(ids)) == len(ids)
+
+    # Verify that the rows were committed
+    for i, message_id in enumerate(ids):
+        message_cache.invalidate(message_id)
+        response = await async_client.get(f"/api/v1/messages/{message_id}/async")
+        assert response.json()["content"] == f"Batched message {i}"
+
+@pytest.mark.anyio
+async def test_get_message_async_calls_share_one_query(async_client):
+    from fastapi import HTTPException
+    from sqlalchemy import event
+    from backend.fastapi.crud import MessageService
+    from backend.fastapi.dependencies.database import LazySessions, get_async_engine
+
+    response = await async_client.post("/api/v1/messages/bulk/async", json=[valid_message_data] * 3)
+    ids = [uuid.UUID(message_id) for message_id in response.json()["ids"]]
+    for message_id in ids:
+        await message_cache.invalidate_async(message_id)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Concurrent lookups in one request are coalesced by the service's loader
+    sync_engine = get_async_engine().sync_engine
+    event.listen(sync_engine, "before_cursor_execute", record)
+    sessions = LazySessions()
+    try:
+        service = MessageService(sessions)
+        messages = await asyncio.gather(*(service.get_message_async(message_id) for message_id in ids))
+        with pytest.raises(HTTPException) as error:
+            await service.get_message_async(uuid.uuid4())
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
+        await sessions.close()
+
+    assert [message.id for message in messages] == ids
+    assert error.value.status_code == status.HTTP_404_NOT_FOUND
+    assert len(statements) == 2
@@ -1,8 +1,13 @@
+import csv
+import io
+import json
 import pytest
 import uuid
 from fastapi import status
 from fastapi.testclient import TestClient
 from backend.fastapi.main import app
+from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.dependencies.cache import message_cache
 
 client = TestClient(app)
 
@@ -103,4 +108,442 @@ def test_delete_message():
     
     # Verify that the message no longer exists
     get_response = client.get(f"/api/v1/messages/{message_id}")
-    assert get_response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+def test_create_messages_bulk():
+    bulk_data = [{"content": f"Bulk message {i}"} for i in range(5)]
+
+    # Send a POST request with several messages at once
+    response = client.post("/api/v1/messages/bulk", json=bulk_data)
+
+    # Verify that the request was successful and returned one id per message
+    assert response.status_code == status.HTTP_201_CREATED
+    ids = response.json()["ids"]
+    assert len(ids) == len(bulk_data)
+
+    # Verify that the messages were stored in order
+    for message_id, message_data in zip(ids, bulk_data):
+        get_response = client.get(f"/api/v1/messages/{message_id}")
+        assert get_response.status_code == status.HTTP_200_OK
+        assert get_response.json()["content"] == message_data["content"]
+
+def test_create_messages_bulk_empty():
+    response = client.post("/api/v1/messages/bulk", json=[])
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["ids"] == []
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_create_messages_bulk_limit(engine, monkeypatch):
+    monkeypatch.setattr(global_settings, "BULK_CREATE_MAX_MESSAGES", 2)
+    response = client.post(f"/api/v1/messages/bulk/{engine}", json=[valid_message_data] * 3)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_get_messages_cursor():
+    # Create enough messages to fill several pages
+    client.post("/api/v1/messages/bulk", json=[valid_message_data] * 12)
+    expected_ids = [message["id"] for message in client.get("/api/v1/messages/", params={"limit": 12}).json()]
+
+    # Walk the same range page by page using the cursor returned in the headers
+    seen_ids = []
+    params = {"limit": 3}
+    for _ in range(4):
+        response = client.get("/api/v1/messages/", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen_ids.extend(message["id"] for message in response.json())
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    # Verify that keyset and offset pagination agree
+    assert seen_ids == expected_ids
+
+def test_get_messages_invalid_cursor():
+    response = client.get("/api/v1/messages/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_get_messages_fast_json_matches_schema(engine, monkeypatch):
+    client.post("/api/v1/messages/bulk", json=[valid_message_data] * 5)
+    params = {"limit": 5}
+
+    monkeypatch.setattr(global_settings, "FAST_JSON_RESPONSES", False)
+    schema_response = client.get(f"/api/v1/messages/{engine}", params=params)
+    monkeypatch.setattr(global_settings, "FAST_JSON_RESPONSES", True)
+    fast_response = client.get(f"/api/v1/messages/{engine}", params=params)
+
+    # Verify that both paths return the same body and cursor
+    assert fast_response.status_code == status.HTTP_200_OK
+    assert fast_response.headers["content-type"] == "application/json"
+    assert fast_response.json() == schema_response.json()
+    assert fast_response.headers["X-Next-Cursor"] == schema_response.headers["X-Next-Cursor"]
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_search_messages(engine):
+    marker = uuid.uuid4().hex
+    client.post("/api/v1/messages/bulk", json=[
+        {"content": f"{marker} boiler repair"},
+        {"content": f"{marker} {marker} boiler"},
+        {"content": "unrelated message"},
+    ])
+
+    response = client.get(f"/api/v1/messages/search/{engine}", params={"q": marker})
+    assert response.status_code == status.HTTP_200_OK
+    # Ranked: the message mentioning the term twice comes first
+    assert [message["content"] for message in response.json()] == [f"{marker} {marker} boiler", f"{marker} boiler repair"]
+
+    response = client.get(f"/api/v1/messages/search/{engine}", params={"q": f"{marker} repair", "limit": 1})
+    assert [message["content"] for message in response.json()] == [f"{marker} boiler repair"]
+
+def test_search_follows_updates_and_deletes():
+    marker = uuid.uuid4().hex
+    message_id = client.post("/api/v1/messages/", json={"content": f"{marker} old"}).json()["id"]
+
+    client.put(f"/api/v1/messages/{message_id}", json={"content": f"{marker} new"})
+    assert client.get("/api/v1/messages/search", params={"q": f"{marker} old"}).json() == []
+    assert [m["id"] for m in client.get("/api/v1/messages/search", params={"q": f"{marker} new"}).json()] == [message_id]
+
+    client.delete(f"/api/v1/messages/{message_id}")
+    assert client.get("/api/v1/messages/search", params={"q": marker}).json() == []
+
+def test_search_survives_renumbered_rowids(tmp_path):
+    from sqlalchemy import create_engine, delete, insert
+    from backend.fastapi.crud.message import build_message_rows, search_query
+    from backend.fastapi.dependencies.database import Base
+    from backend.fastapi.models import Message
+    from backend.fastapi.schemas.message import MessageCreate
+
+    search_engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(search_engine)
+    rows = build_message_rows([MessageCreate(content=f"message {n} term{n}") for n in range(20)])
+    with search_engine.begin() as conn:
+        conn.execute(insert(Message), rows)
+        conn.execute(delete(Message).where(Message.id.in_([row["id"] for row in rows[:10]])))
+        # Renumbered the way VACUUM may renumber them
+        conn.exec_driver_sql("UPDATE messages SET rowid = rowid - 10")
+    with search_engine.connect() as conn:
+        for row in rows[10:]:
+            found = conn.execute(search_query("sqlite", row["content"].split()[-1], 0, 10, Message.id)).scalars().all()
+            assert found == [row["id"]]
+    search_engine.dispose()
+
+def test_search_messages_query_syntax_is_literal():
+    response = client.get("/api/v1/messages/search", params={"q": '"unbalanced AND ('})
+    assert response.status_code == status.HTTP_200_OK
+    assert client.get("/api/v1/messages/search", params={"q": ""}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_get_message_conditional(engine):
+    message = client.post("/api/v1/messages/", json=valid_message_data).json()
+    url = f"/api/v1/messages/{message['id']}/{engine}"
+
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    assert etag == '"1"'
+    assert "Last-Modified" in response.headers
+
+    # Unchanged: 304 without a body
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Changed: the new version and body
+    client.put(url, json={"content": "Changed"})
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["version"] == 2
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_get_message_conditional_with_workers(engine, monkeypatch):
+    from sqlalchemy import update
+    from backend.fastapi.dependencies.database import get_sync_engine
+    from backend.fastapi.models import Message
+
+    message = client.post("/api/v1/messages/", json=valid_message_data).json()
+    url = f"/api/v1/messages/{message['id']}/{engine}"
+    etag = client.get(url).headers["ETag"]
+
+    # Another worker's update never reaches this worker's cache, so the primary decides
+    monkeypatch.setattr(global_settings, "WEB_CONCURRENCY", 2)
+    with get_sync_engine().begin() as connection:
+        connection.execute(update(Message).where(Message.id == uuid.UUID(message["id"])).values(version=2))
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == status.HTTP_200_OK
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_get_messages_conditional(engine):
+    client.post("/api/v1/messages/bulk", json=[valid_message_data] * 3)
+    url = f"/api/v1/messages/{engine}"
+    params = {"limit": 3}
+
+    response = client.get(url, params=params)
+    etag = response.headers["ETag"]
+    assert client.get(url, params=params, headers={"If-None-Match": etag}).status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Updating a message on the page changes the page's ETag
+    client.put(f"/api/v1/messages/{response.json()[0]['id']}", json={"content": "Changed"})
+    response = client.get(url, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_update_message_if_match(engine):
+    message = client.post("/api/v1/messages/", json=valid_message_data).json()
+    url = f"/api/v1/messages/{message['id']}/{engine}"
+
+    response = client.put(url, json={"content": "First"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"2"'
+
+    # A second writer still holding version 1 must not overwrite the first
+    response = client.put(url, json={"content": "Second"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert client.get(url).json()["content"] == "First"
+
+    missing_url = f"/api/v1/messages/{uuid.uuid4()}/{engine}"
+    assert client.put(missing_url, json={"content": "x"}, headers={"If-Match": '"1"'}).status_code == status.HTTP_404_NOT_FOUND
+
+def test_get_message_checks_out_one_sync_connection(pool_checkouts):
+    # Create a sample message
+    create_response = client.post("/api/v1/messages/", json=valid_message_data)
+    message_id = create_response.json()["id"]
+    message_cache.invalidate(message_id)
+    pool_checkouts.update({"sync": 0, "async": 0})
+
+    # An uncached sync read should only ever touch the sync pool, once
+    response = client.get(f"/api/v1/messages/{message_id}/sync")
+    assert response.status_code == status.HTTP_200_OK
+    assert pool_checkouts == {"sync": 1, "async": 0}
+
+def test_get_messages_total_count_checks_out_one_sync_connection(pool_checkouts):
+    from backend.fastapi.dependencies.cache import message_count_cache
+
+    message_count_cache.clear()
+    pool_checkouts.update({"sync": 0, "async": 0})
+    response = client.get("/api/v1/messages/sync", params={"count": True, "exact": True})
+    assert "X-Total-Count" in response.headers
+    assert pool_checkouts == {"sync": 1, "async": 0}
+
+def test_get_message_cached():
+    # Create a sample message
+    create_response = client.post("/api/v1/messages/", json=valid_message_data)
+    message_id = create_response.json()["id"]
+    hits_before = client.get("/api/v1/stats/cache").json()["hits"]
+
+    # Repeated reads should be served from the cache
+    client.get(f"/api/v1/messages/{message_id}")
+    client.get(f"/api/v1/messages/{message_id}")
+    assert client.get("/api/v1/stats/cache").json()["hits"] == hits_before + 2
+
+    # Updating the message should refresh the cached entry on both engines
+    client.put(f"/api/v1/messages/{message_id}/async", json={"content": "Updated content"})
+    response = client.get(f"/api/v1/messages/{message_id}")
+    assert response.json()["content"] == "Updated content"
+
+def test_get_pool_stats():
+    # Make sure the sync pool has served at least one checkout
+    client.get("/api/v1/messages/sync")
+
+    response = client.get("/api/v1/stats/pool")
+    assert response.status_code == status.HTTP_200_OK
+
+    # Verify that both pools report occupancy and wait statistics
+    response_data = response.json()
+    for engine in ("sync", "async"):
+        assert {"size", "checked_out", "overflow", "timeouts", "max_wait_ms"} <= set(response_data[engine])
+    assert response_data["sync"]["checkouts"] > 0
+
+def test_update_message_single_statement(sync_statements):
+    # Create a sample message
+    create_response = client.post("/api/v1/messages/", json=valid_message_data)
+    message_id = create_response.json()["id"]
+    sync_statements.clear()
+
+    # An update should be a single UPDATE ... RETURNING
+    response = client.put(f"/api/v1/messages/{message_id}/sync", json={"content": "Updated content"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["content"] == "Updated content"
+    assert len(sync_statements) == 1
+    assert sync_statements[0].startswith("UPDATE")
+
+def test_create_message_single_statement(sync_statements):
+    # A create should be a single INSERT, with no refresh afterwards
+    response = client.post("/api/v1/messages/sync", json=valid_message_data)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(sync_statements) == 1
+    assert sync_statements[0].startswith("INSERT")
+
+def test_update_and_delete_missing_message():
+    missing_id = uuid.uuid4()
+    for engine in ("sync", "async"):
+        response = client.put(f"/api/v1/messages/{missing_id}/{engine}", json={"content": "Updated content"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = client.delete(f"/api/v1/messages/{missing_id}/{engine}")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    # A separate SQLite database standing in for a read replica
+    from sqlalchemy import create_engine
+    from backend.fastapi.dependencies.database import Base, _engines
+
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = create_engine(url)
+    Base.metadata.create_all(replica_engine)
+
+    def drop_replicas():
+        # Replica engines are created once per process, so rebuild them around the test
+        for key in ("sync_replicas", "async_replicas"):
+            for maker in _engines.pop(key, []):
+                engine = maker.kw["bind"]
+                getattr(engine, "sync_engine", engine).dispose()
+
+    drop_replicas()
+    monkeypatch.setattr(global_settings, "DB_REPLICA_URLS", url)
+    yield replica_engine
+    drop_replicas()
+    replica_engine.dispose()
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_reads_use_replica_until_write(engine, replica):
+    from sqlalchemy import insert
+    from backend.fastapi.crud.message import build_message_rows
+    from backend.fastapi.models import Message
+    from backend.fastapi.schemas.message import MessageCreate, MessageSchema
+
+    # A row that only exists on the replica
+    row = build_message_rows([MessageCreate(content="replica only")])[0]
+    with replica.begin() as conn:
+        conn.execute(insert(Message), [row])
+    replica_client = TestClient(app)
+
+    response = replica_client.get(f"/api/v1/messages/{row['id']}/{engine}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["content"] == "replica only"
+
+    # Replica rows may be stale, so they are not cached
+    assert message_cache.get(row["id"]) is None
+    response = replica_client.post(f"/api/v1/messages/batch-get/{engine}", json=[str(row["id"])])
+    assert response.json()["messages"][0]["content"] == "replica only"
+    assert message_cache.get(row["id"]) is None
+
+    # Reading from the primary skips the cache, even where it holds the message
+    message_cache.set(MessageSchema.model_validate(row))
+    response = replica_client.get(f"/api/v1/messages/{row['id']}/{engine}", headers={"X-Read-Primary": "1"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = replica_client.post(f"/api/v1/messages/batch-get/{engine}", json=[str(row["id"])], headers={"X-Read-Primary": "1"})
+    assert response.json()["missing"] == [str(row["id"])]
+    message_cache.invalidate(row["id"])
+
+    # After a write the client reads its own writes from the primary
+    response = replica_client.post(f"/api/v1/messages/{engine}", json=valid_message_data)
+    assert "read_primary" in response.cookies
+    response = replica_client.get(f"/api/v1/messages/{row['id']}/{engine}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_import_and_export_messages(engine):
+    marker = uuid.uuid4().hex
+    body = "".join(f'{{"content": "{marker} {i}"}}\n' for i in range(5)).encode()
+    response = client.post(f"/api/v1/messages/import/{engine}", content=body)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"imported": 5}
+
+    # NDJSON export, one message per line. Rows inserted together share created_at, so they follow id order.
+    response = client.get(f"/api/v1/messages/export/{engine}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["content"] for line in lines if marker in line["content"]) == [f"{marker} {i}" for i in range(5)]
+    assert set(lines[0]) == {"id", "content", "created_at", "version", "updated_at"}
+
+    # CSV export of the same rows, with a header
+    response = client.get(f"/api/v1/messages/export/{engine}", params={"format": "csv"})
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["content"] for row in rows] == [line["content"] for line in lines]
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_import_csv_in_small_chunks(engine):
+    marker = uuid.uuid4().hex
+    body = f'content\n"{marker}, with ""quotes""\nand a newline"\n{marker} é\n'.encode()
+    # One byte per chunk, splitting lines, quoted fields and the UTF-8 sequence
+    chunks = iter([body[i:i + 1] for i in range(len(body))])
+    response = client.post(f"/api/v1/messages/import/{engine}", params={"format": "csv"}, content=chunks)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"imported": 2}
+
+    lines = [json.loads(line) for line in client.get(f"/api/v1/messages/export/{engine}").text.splitlines()]
+    assert sorted(line["content"] for line in lines if marker in line["content"]) == sorted([
+        f'{marker}, with "quotes"\nand a newline',
+        f"{marker} é",
+    ])
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_import_invalid_line_imports_nothing(engine, monkeypatch):
+    # Earlier batches are inserted before the bad line is read; they are rolled back with it
+    monkeypatch.setattr(global_settings, "IMPORT_BATCH_SIZE", 2)
+    marker = uuid.uuid4().hex
+    body = f'{{"content": "{marker}"}}\n' * 3 + '{"text": "no content"}\n'
+    response = client.post(f"/api/v1/messages/import/{engine}", content=body.encode())
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json()["detail"].startswith("line 4:")
+    assert marker not in client.get(f"/api/v1/messages/export/{engine}").text
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_batch_get_messages(engine, sync_statements):
+    ids = client.post("/api/v1/messages/bulk", json=[valid_message_data] * 3).json()["ids"]
+    missing_id = str(uuid.uuid4())
+    for message_id in ids:
+        message_cache.invalidate(message_id)
+    sync_statements.clear()
+
+    # Input order, duplicates included, with null for the misses
+    requested = [ids[2], missing_id, ids[0], ids[2], ids[1]]
+    response = client.post(f"/api/v1/messages/batch-get/{engine}", json=requested)
+    assert response.status_code == status.HTTP_200_OK
+    response_data = response.json()
+    assert [message and message["id"] for message in response_data["messages"]] == [ids[2], None, ids[0], ids[2], ids[1]]
+    assert response_data["missing"] == [missing_id]
+    if engine == "sync":
+        # One IN query for every id
+        assert len(sync_statements) == 1
+
+    # The found messages are cached, so the next lookup only queries for the miss
+    sync_statements.clear()
+    response = client.post(f"/api/v1/messages/batch-get/{engine}", json=requested)
+    assert response.json() == response_data
+    if engine == "sync":
+        assert len(sync_statements) == 1
+        assert "IN" in sync_statements[0]
+
+def test_batch_get_messages_limit(monkeypatch):
+    monkeypatch.setattr(global_settings, "BATCH_GET_MAX_IDS", 2)
+    response = client.post("/api/v1/messages/batch-get", json=[str(uuid.uuid4()) for _ in range(3)])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_get_messages_total_count(engine, monkeypatch, query_budget):
+    from backend.fastapi.dependencies.cache import message_count_cache
+
+    message_count_cache.clear()
+    response = client.get(f"/api/v1/messages/{engine}", params={"limit": 1})
+    assert "X-Total-Count" not in response.headers
+
+    # No planner estimate on SQLite, so the exact count is used and reused
+    total = int(client.get(f"/api/v1/messages/{engine}", params={"limit": 1, "count": "true"}).headers["X-Total-Count"])
+    client.post("/api/v1/messages/", json=valid_message_data)
+    with query_budget(1):
+        response = client.get(f"/api/v1/messages/{engine}", params={"limit": 1, "count": "true"})
+    assert int(response.headers["X-Total-Count"]) == total
+
+    # Once the cached count expires, exact=true counts again
+    monkeypatch.setattr(global_settings, "TOTAL_COUNT_TTL", 0)
+    response = client.get(f"/api/v1/messages/{engine}", params={"limit": 1, "exact": "true"})
+    assert int(response.headers["X-Total-Count"]) == total + 1
+    message_count_cache.clear()
+
+def test_estimate_count_query():
+    from sqlalchemy.dialects import postgresql
+    from backend.fastapi.crud.message import estimate_count_query
+
+    assert "reltuples" in str(estimate_count_query("postgresql").compile(dialect=postgresql.dialect()))
+    assert estimate_count_query("sqlite") is None
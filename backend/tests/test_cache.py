@@ -0,0 +1,61 @@
+import time
+import pytest
+from backend.fastapi.dependencies.cache import LRUCache, RedisCache
+
+def test_lru_cache_hit_and_miss():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", {"value": 1})
+
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", {"value": 1})
+    cache.set("b", {"value": 2})
+
+    # Touch "a" so that "b" becomes the least recently used entry
+    cache.get("a")
+    cache.set("c", {"value": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("c") == {"value": 3}
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_size=2, ttl=0.01)
+    cache.set("a", {"value": 1})
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+def test_lru_cache_disabled_with_zero_size():
+    cache = LRUCache(max_size=0, ttl=60)
+    cache.set("a", {"value": 1})
+    assert cache.get("a") is None
+
+def test_lru_cache_get_many():
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set_many({"a": {"value": 1}, "b": {"value": 2}})
+
+    assert cache.get_many(["b", "c", "a"]) == [{"value": 2}, None, {"value": 1}]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+def test_redis_cache_errors_are_misses():
+    pytest.importorskip("redis")
+    # Nothing listens on port 1, so every command fails
+    cache = RedisCache("redis://127.0.0.1:1/0", ttl=60)
+    cache.set("a", {"value": 1})
+    cache.delete("a")
+    cache.set_many({"a": {"value": 1}})
+
+    assert cache.get("a") is None
+    assert cache.get_many(["a", "b"]) == [None, None]
+    assert cache.stats()["misses"] == 3
+    assert cache.stats()["errors"] == 5
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
+from backend.fastapi.main import app
+from backend.fastapi.dependencies.events import MemoryEventBroker, MessageEvents, RedisEventBroker, message_events
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+async def delivered():
+    # Publishes are handed to the subscriber's loop with call_soon_threadsafe
+    await asyncio.sleep(0)
+
+@pytest.mark.anyio
+async def test_full_queue_drops_oldest():
+    broker = MemoryEventBroker(queue_size=2)
+    subscription = broker.subscribe()
+    for i in range(3):
+        broker.publish({"type": "created", "i": i})
+    await delivered()
+
+    # The subscriber learns how many events it missed, then gets the newest ones
+    assert await subscription.get() == {"type": "dropped", "count": 1}
+    assert await subscription.get() == {"type": "created", "i": 1}
+    assert await subscription.get() == {"type": "created", "i": 2}
+    assert broker.stats()["dropped"] == 1
+
+    broker.unsubscribe(subscription)
+    assert broker.stats()["subscribers"] == 0
+
+@pytest.mark.anyio
+async def test_publish_from_threads():
+    broker = MemoryEventBroker(queue_size=1000)
+    subscription = broker.subscribe()
+
+    def publish(thread):
+        for i in range(50):
+            broker.publish({"type": "created", "thread": thread, "i": i})
+
+    threads = [threading.Thread(target=publish, args=(thread,)) for thread in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    await delivered()
+
+    events = [await subscription.get() for _ in range(250)]
+    for thread in range(5):
+        # Each publisher's events arrive in order
+        assert [event["i"] for event in events if event["thread"] == thread] == list(range(50))
+
+def test_events_are_not_built_without_subscribers():
+    # Building an event from this object would fail validation
+    MessageEvents(MemoryEventBroker(queue_size=10)).publish("created", object())
+
+@pytest.mark.anyio
+async def test_redis_errors_are_survived():
+    pytest.importorskip("redis")
+    # Nothing listens on port 1, so every command fails
+    broker = RedisEventBroker("redis://127.0.0.1:1/0", queue_size=10)
+    broker.publish({"type": "created"})
+
+    subscription = broker.subscribe()
+    await asyncio.sleep(0.5)
+    # The listener keeps reconnecting instead of dying on the first error
+    assert broker._listener.is_alive()
+    broker.unsubscribe(subscription)
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_websocket_feed(engine):
+    client = TestClient(app)
+    with client.websocket_connect("/api/v1/messages/ws") as websocket:
+        created = client.post(f"/api/v1/messages/{engine}", json={"content": "Hello, world!"}).json()
+        assert websocket.receive_json() == {"type": "created", "message": created}
+
+        message_id = created["id"]
+        updated = client.put(f"/api/v1/messages/{message_id}/{engine}", json={"content": "Updated content"}).json()
+        assert websocket.receive_json() == {"type": "updated", "message": updated}
+
+        client.delete(f"/api/v1/messages/{message_id}/{engine}")
+        event = websocket.receive_json()
+        assert event["type"] == "deleted"
+        assert event["message"]["id"] == message_id
+
+        response = client.post(f"/api/v1/messages/bulk/{engine}", json=[{"content": "Hello, world!"}] * 2)
+        ids = response.json()["ids"]
+        assert [websocket.receive_json()["message"]["id"] for _ in ids] == ids
+
+    assert message_events.stats()["subscribers"] == 0
+
+@pytest.mark.anyio
+async def test_sse_stream():
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/messages/stream",
+        "raw_path": b"/api/v1/messages/stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    messages = asyncio.Queue()
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def next_message():
+        return await asyncio.wait_for(messages.get(), 5)
+
+    stream = asyncio.create_task(app(scope, receive, messages.put))
+    start = await next_message()
+    assert start["status"] == status.HTTP_200_OK
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert (await next_message())["body"] == b": connected\n\n"
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        created = (await client.post("/api/v1/messages/async", json={"content": "Hello, world!"})).json()
+    body = (await next_message())["body"].decode()
+    assert body.startswith("event: created\ndata: ")
+    assert body.endswith("\n\n")
+    assert created["id"] in body
+
+    # Disconnecting ends the stream and its subscription
+    disconnected.set()
+    await asyncio.wait_for(stream, 5)
+    assert message_events.stats()["subscribers"] == 0
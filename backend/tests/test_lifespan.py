@@ -0,0 +1,94 @@
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+import pytest
+from sqlalchemy import text
+from fastapi import status
+from fastapi.testclient import TestClient
+from backend.fastapi.main import app
+from backend.fastapi.core.constants import SEED_NAMESPACE
+from backend.fastapi.dependencies.database import dispose_retired_engines, get_async_engine, get_sync_sessionmaker, reset_engines
+from backend.fastapi.models import Message
+from backend.data.init_data import models_data
+
+def count_seed_rows():
+    seed_ids = [uuid.uuid5(SEED_NAMESPACE, raw_data["content"]) for raw_data in models_data]
+    with get_sync_sessionmaker()() as db:
+        return db.query(Message).filter(Message.id.in_(seed_ids)).count()
+
+def test_startup_seeds_once():
+    # Run the app lifespan twice, as two restarts would
+    with TestClient(app) as client:
+        assert count_seed_rows() == len(models_data)
+        seed_id = uuid.uuid5(SEED_NAMESPACE, models_data[0]["content"])
+        response = client.get(f"/api/v1/messages/{seed_id}")
+        assert response.status_code == status.HTTP_200_OK
+    with TestClient(app):
+        assert count_seed_rows() == len(models_data)
+
+    # Verify that the startup phases were timed
+    assert {"schema_ms", "seed_ms", "total_ms"} <= set(app.state.startup_timings)
+
+def test_create_app_with_settings(tmp_path):
+    database = tmp_path / "factory.db"
+    # A fresh interpreter, so the import check and the settings swap can't affect other tests
+    script = f"""
+import sys
+import backend.fastapi.main as main
+assert "fastapi" not in sys.modules and "sqlalchemy" not in sys.modules
+
+from fastapi.testclient import TestClient
+from backend.fastapi.core.config import DevSettings
+app = main.create_app(DevSettings(DEV_DB_URL="sqlite:///{database}", DEFAULT_DB_ENGINE="async"))
+with TestClient(app) as client:
+    assert client.post("/api/v1/messages/", json={{"content": "factory"}}).status_code == 201
+
+# The unsuffixed routes follow the settings the app was created with
+[route] = [route for route in app.routes if route.path == "/api/v1/messages/" and "POST" in route.methods]
+assert route.endpoint.__name__ == "create_message_async"
+"""
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=Path(__file__).parents[2])
+
+    # Verify that the app used the database from its settings
+    assert database.exists()
+
+def test_create_schema_adds_missing_columns(tmp_path):
+    from sqlalchemy import create_engine, inspect, select
+    from sqlalchemy.orm import Session
+    from backend.fastapi.dependencies.database import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    message_id = uuid.uuid4()
+    # The messages table as it was before created_at, version and updated_at
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE messages (id CHAR(32) NOT NULL PRIMARY KEY, content VARCHAR)")
+        conn.exec_driver_sql("INSERT INTO messages (id, content) VALUES (?, 'old')", (message_id.hex,))
+
+    # Twice, as every startup does
+    Base.metadata.create_all(engine)
+    Base.metadata.create_all(engine)
+    assert "ix_messages_created_at_id" in {index["name"] for index in inspect(engine).get_indexes("messages")}
+    with Session(engine) as db:
+        message = db.scalars(select(Message)).one()
+        assert message.id == message_id and message.version == 1
+        assert message.created_at is not None and message.updated_at is not None
+    engine.dispose()
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+@pytest.mark.anyio
+async def test_reset_engines_closes_async_connections():
+    engine = get_async_engine()
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    pool = engine.pool
+    assert pool.checkedin() >= 1
+
+    # Replaced engines keep their connections until an event loop can close them
+    reset_engines()
+    assert get_async_engine() is not engine
+    await dispose_retired_engines()
+    assert pool.checkedin() == 0
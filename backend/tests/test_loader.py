@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from backend.fastapi.crud.loader import DataLoader
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+class RecordingLoad:
+    # batch_load that squares its keys, skips negative ones and records every call
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, keys):
+        self.calls.append(list(keys))
+        await asyncio.sleep(0)
+        return {key: key * key for key in keys if key >= 0}
+
+@pytest.mark.anyio
+async def test_loads_in_one_tick_share_a_batch():
+    batch_load = RecordingLoad()
+    loader = DataLoader(batch_load, max_batch_size=100)
+
+    assert await asyncio.gather(loader.load(1), loader.load(2), loader.load(-3), loader.load(2)) == [1, 4, None, 4]
+    assert batch_load.calls == [[1, 2, -3]]
+
+    # Keys already loaded are not fetched again
+    assert await loader.load_many([2, 4]) == [4, 16]
+    assert batch_load.calls == [[1, 2, -3], [4]]
+
+@pytest.mark.anyio
+async def test_batches_are_split_and_run_one_at_a_time():
+    running = 0
+    calls = []
+
+    async def batch_load(keys):
+        nonlocal running
+        running += 1
+        assert running == 1
+        calls.append(list(keys))
+        await asyncio.sleep(0)
+        running -= 1
+        return {key: key for key in keys}
+
+    loader = DataLoader(batch_load, max_batch_size=2)
+    assert await loader.load_many([1, 2, 3, 4, 5]) == [1, 2, 3, 4, 5]
+    assert calls == [[1, 2], [3, 4], [5]]
+
+@pytest.mark.anyio
+async def test_failed_batch_is_not_remembered():
+    attempts = 0
+
+    async def batch_load(keys):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("database unavailable")
+        return {key: key for key in keys}
+
+    loader = DataLoader(batch_load, max_batch_size=100)
+    with pytest.raises(RuntimeError):
+        await loader.load(1)
+    assert await loader.load(1) == 1
+
+@pytest.mark.anyio
+async def test_prime_and_clear():
+    batch_load = RecordingLoad()
+    loader = DataLoader(batch_load, max_batch_size=100)
+    loader.prime(5, "primed")
+    assert await loader.load(5) == "primed"
+
+    loader.clear(5)
+    assert await loader.load(5) == 25
+    assert batch_load.calls == [[5]]
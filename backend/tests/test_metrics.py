@@ -0,0 +1,52 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from backend.fastapi.main import app
+from backend.fastapi.core.metrics import Histogram
+
+client = TestClient(app)
+
+# Mock data for creating a message
+valid_message_data = {
+    "content": "Hello, metrics!"
+}
+
+def test_metrics_labels_by_route_template():
+    # Create and read a message so the item route has been observed
+    create_response = client.post("/api/v1/messages/", json=valid_message_data)
+    message_id = create_response.json()["id"]
+    client.get(f"/api/v1/messages/{message_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    # Verify that requests are grouped by route template, not raw path
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/v1/messages/{message_id}",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/v1/messages/{message_id}",le="+Inf"}' in body
+    assert message_id not in body
+    assert "http_requests_in_flight" in body
+    assert 'db_pool_checked_out{engine="sync"}' in body
+
+def test_latency_stats():
+    client.get("/api/v1/messages/")
+
+    response = client.get("/api/v1/stats/latency")
+    assert response.status_code == status.HTTP_200_OK
+
+    # Verify that the list route reports percentiles
+    routes = {(entry["method"], entry["route"]): entry for entry in response.json()}
+    entry = routes[("GET", "/api/v1/messages/")]
+    assert entry["count"] > 0
+    assert entry["p50_ms"] <= entry["p95_ms"] <= entry["p99_ms"]
+
+def test_histogram_quantile():
+    histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(0.15)
+    assert 0.2 < histogram.quantile(0.99) <= 0.4
@@ -0,0 +1,92 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from backend.fastapi.core.compression import accepts_gzip, gzip_etag, strip_gzip_etag
+from backend.fastapi.core.conditional import if_match_versions
+from backend.fastapi.main import app
+
+def test_docs_redirect_to_login_without_session():
+    client = TestClient(app)
+    response = client.get("/docs", follow_redirects=False)
+    assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert response.headers["location"] == "/login"
+
+def test_login_unlocks_docs(monkeypatch):
+    monkeypatch.setenv("USER_NAME", "admin")
+    monkeypatch.setenv("PASSWORD", "secret")
+    client = TestClient(app)
+
+    response = client.post("/login", data={"username": "admin", "password": "secret"}, follow_redirects=False)
+    assert response.status_code == status.HTTP_303_SEE_OTHER
+    assert "session" in response.cookies
+
+    assert client.get("/docs").status_code == status.HTTP_200_OK
+    assert client.get("/openapi.json").status_code == status.HTTP_200_OK
+
+    client.get("/logout")
+    assert client.get("/docs", follow_redirects=False).status_code == status.HTTP_307_TEMPORARY_REDIRECT
+
+def test_api_requests_skip_the_session():
+    client = TestClient(app)
+    client.cookies.set("session", "not-a-valid-session")
+    response = client.get("/api/v1/messages/")
+
+    # The cookie is neither decoded nor re-issued outside the doc and login paths
+    assert response.status_code == status.HTTP_200_OK
+    assert "set-cookie" not in response.headers
+
+def test_accepts_gzip():
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, *;q=0.5")
+    assert not accepts_gzip("")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip("gzip;q=0, *")
+
+def test_large_responses_are_gzipped():
+    client = TestClient(app)
+    client.post("/api/v1/messages/bulk", json=[{"content": "Hello, world! " * 10}] * 20)
+
+    response = client.get("/api/v1/messages/", params={"limit": 20}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    # The client decompresses the body
+    assert len(response.json()) == 20
+
+    response = client.get("/api/v1/messages/", params={"limit": 20}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+def test_gzipped_responses_have_their_own_etag():
+    client = TestClient(app)
+    client.post("/api/v1/messages/bulk", json=[{"content": "Hello, world! " * 10}] * 20)
+
+    plain = client.get("/api/v1/messages/", params={"limit": 20}, headers={"Accept-Encoding": "identity"})
+    response = client.get("/api/v1/messages/", params={"limit": 20}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    # Either validator revalidates the page, and the 304 hands back the same one
+    for etag in (response.headers["etag"], plain.headers["etag"]):
+        response = client.get(
+            "/api/v1/messages/", params={"limit": 20}, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["etag"] == etag
+
+def test_gzip_etag():
+    assert gzip_etag('"5"') == '"5-gzip"'
+    assert gzip_etag('W/"5"') == 'W/"5-gzip"'
+    assert strip_gzip_etag('"5-gzip"') == '"5"'
+    assert strip_gzip_etag('"5"') == '"5"'
+    assert if_match_versions('"5-gzip", "6"') == [5, 6]
+
+def test_small_and_streamed_responses_are_not_gzipped():
+    client = TestClient(app)
+    created = client.post("/api/v1/messages/", json={"content": "Hello, world!"}).json()
+
+    response = client.get(f"/api/v1/messages/{created['id']}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "content-encoding" not in response.headers
+
+    # Exports are streamed, however large
+    response = client.get("/api/v1/messages/export", headers={"Accept-Encoding": "gzip"})
+    assert len(response.content) > 1000
+    assert "content-encoding" not in response.headers
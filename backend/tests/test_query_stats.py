@@ -0,0 +1,101 @@
+import logging
+import re
+import pytest
+import uuid
+from fastapi.testclient import TestClient
+from backend.fastapi.main import app
+from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.dependencies.cache import message_cache
+from backend.fastapi.dependencies.database import QueryStats, log_repeated_queries, query_logger
+
+client = TestClient(app)
+
+valid_message_data = {
+    "content": "Hello, world!"
+}
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.fixture
+def sql_log():
+    handler = RecordingHandler()
+    query_logger.addHandler(handler)
+    yield handler.records
+    query_logger.removeHandler(handler)
+
+def server_timing(response) -> dict:
+    # {"db": {"dur": "1.234", "desc": "\"2 queries\""}, ...}
+    metrics = {}
+    for metric in response.headers["Server-Timing"].split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_server_timing_header(engine):
+    message_id = client.post(f"/api/v1/messages/{engine}", json=valid_message_data).json()["id"]
+    message_cache.invalidate(message_id)
+
+    metrics = server_timing(client.get(f"/api/v1/messages/{message_id}/{engine}"))
+    assert metrics["db"]["desc"] == '"1 queries"'
+    assert float(metrics["db"]["dur"]) > 0
+    assert float(metrics["db-slowest"]["dur"]) == float(metrics["db"]["dur"])
+    assert float(metrics["app"]["dur"]) >= 0
+
+    # Served from the cache: no database time
+    metrics = server_timing(client.get(f"/api/v1/messages/{message_id}/{engine}"))
+    assert metrics["db"] == {"dur": "0.000", "desc": '"0 queries"'}
+    assert "db-slowest" not in metrics
+
+def test_server_timing_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(global_settings, "SERVER_TIMING_ENABLED", False)
+    assert "Server-Timing" not in client.get("/api/v1/messages/").headers
+
+def test_slow_query_log(monkeypatch, sql_log):
+    monkeypatch.setattr(global_settings, "SLOW_QUERY_SECONDS", 1e-9)
+    client.get("/api/v1/messages/", params={"limit": 1})
+
+    record = sql_log[-1]
+    assert record.levelno == logging.WARNING
+    assert record.method == "GET"
+    assert record.path == "/api/v1/messages/"
+    assert record.duration_ms > 0
+    assert record.statement.startswith("SELECT")
+
+def test_repeated_query_log(monkeypatch, sql_log):
+    monkeypatch.setattr(global_settings, "QUERY_REPEAT_WARNING", 3)
+    stats = QueryStats("GET", "/api/v1/messages/")
+    for _ in range(3):
+        stats.record("SELECT * FROM messages WHERE id = ?", 0.001)
+    stats.record("SELECT count(*) FROM messages", 0.001)
+    log_repeated_queries(stats)
+
+    assert len(sql_log) == 1
+    assert sql_log[0].count == 3
+    assert sql_log[0].statement == "SELECT * FROM messages WHERE id = ?"
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_endpoint_query_budgets(engine, query_budget):
+    with query_budget(1):
+        message_id = client.post(f"/api/v1/messages/{engine}", json=valid_message_data).json()["id"]
+    message_cache.invalidate(message_id)
+    with query_budget(1):
+        client.get(f"/api/v1/messages/{message_id}/{engine}")
+    with query_budget(1):
+        client.get(f"/api/v1/messages/{engine}", params={"limit": 10})
+    with query_budget(1):
+        client.post(f"/api/v1/messages/batch-get/{engine}", json=[message_id, str(uuid.uuid4())])
+    with query_budget(1):
+        client.put(f"/api/v1/messages/{message_id}/{engine}", json={"content": "Updated content"})
+
+def test_query_budget_fails_over_budget(query_budget):
+    with pytest.raises(AssertionError, match=re.escape("2 queries over a budget of 1")):
+        with query_budget(1):
+            client.get("/api/v1/messages/", params={"limit": 1})
+            client.get("/api/v1/messages/", params={"limit": 1})
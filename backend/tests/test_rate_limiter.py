@@ -0,0 +1,100 @@
+import pytest
+from fastapi import Depends, FastAPI, WebSocket, status
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.dependencies import rate_limiter
+from backend.fastapi.dependencies.rate_limiter import MemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend, check_ip_rate_limit, check_websocket_rate_limit
+
+@pytest.fixture
+def limited_client(monkeypatch):
+    monkeypatch.setattr(global_settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(global_settings, "RATE_LIMIT_CLIENT_TIMES", 5)
+    monkeypatch.setattr(rate_limiter, "rate_limit_backend", MemoryRateLimitBackend(shards=4, max_keys=100))
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}", dependencies=[Depends(check_ip_rate_limit), Depends(RateLimiter(times=2, seconds=60))])
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/other", dependencies=[Depends(check_ip_rate_limit)])
+    async def get_other():
+        return {}
+
+    @app.websocket("/ws", dependencies=[Depends(check_websocket_rate_limit)])
+    async def feed(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.close()
+
+    return TestClient(app)
+
+def test_route_limit_returns_retry_after(limited_client):
+    # Different ids share the route template's bucket
+    assert limited_client.get("/items/1").status_code == status.HTTP_200_OK
+    assert limited_client.get("/items/2").status_code == status.HTTP_200_OK
+
+    response = limited_client.get("/items/3")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+
+def test_client_limit_spans_routes(limited_client):
+    limited_client.get("/items/1")
+    for _ in range(4):
+        assert limited_client.get("/other").status_code == status.HTTP_200_OK
+    assert limited_client.get("/other").status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+def test_websocket_shares_the_client_limit(limited_client):
+    for _ in range(4):
+        limited_client.get("/other")
+    with limited_client.websocket_connect("/ws"):
+        pass
+
+    # Refused before the handshake is accepted
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with limited_client.websocket_connect("/ws"):
+            pass
+    assert refused.value.code == status.WS_1008_POLICY_VIOLATION
+
+def test_redis_errors_allow_requests(limited_client, monkeypatch):
+    pytest.importorskip("redis")
+    # Nothing listens on port 1, so every check fails
+    backend = RedisRateLimitBackend("redis://127.0.0.1:1/0")
+    monkeypatch.setattr(rate_limiter, "rate_limit_backend", backend)
+
+    for _ in range(3):
+        assert limited_client.get("/items/1").status_code == status.HTTP_200_OK
+    assert backend.stats()["errors"] == 6
+
+def test_token_bucket_refills():
+    backend = MemoryRateLimitBackend(shards=1)
+    assert backend.hit("client", times=1, seconds=0.05) == 0
+    assert backend.hit("client", times=1, seconds=0.05) > 0
+
+    shard = backend.shards[0]
+    tokens, updated_at, full_at = shard.buckets["client"]
+    assert shard.hit("client", 1, 0.05, now=full_at + 0.001) == 0
+
+def test_memory_backend_bounds_keys():
+    backend = MemoryRateLimitBackend(shards=4, max_keys=40)
+    for i in range(10000):
+        backend.hit(f"client-{i}", times=10, seconds=60)
+
+    stats = backend.stats()
+    assert stats["keys"] <= stats["max_keys"] == 40
+    assert stats["evictions"] == 10000 - stats["keys"]
+
+def test_memory_backend_evicts_idle_keys():
+    backend = MemoryRateLimitBackend(shards=1)
+    shard = backend.shards[0]
+    shard.hit("idle", 10, 1, now=0.0)
+
+    # Once its bucket has refilled, the idle key is dropped by the next hit in the shard
+    shard.hit("active", 10, 1, now=5.0)
+    assert list(shard.buckets) == ["active"]
+
+def test_rate_limit_disabled_by_default():
+    from backend.fastapi.main import app
+    client = TestClient(app)
+    assert global_settings.RATE_LIMIT_ENABLED is False
+    assert client.get("/api/v1/stats/rate-limit").json()["backend"] == "memory"
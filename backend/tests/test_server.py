@@ -0,0 +1,75 @@
+import os
+import pytest
+from sqlalchemy import text
+from backend.fastapi.core.config import get_settings
+from backend.fastapi.dependencies.database import get_sync_engine
+from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.dependencies.cache import create_cache_backend
+from backend.fastapi.server import parse_args, run, server_options, shared_state_warnings
+
+def test_prod_server_options():
+    settings = get_settings("prod")
+    options = server_options(parse_args(["--mode", "prod", "--host", "0.0.0.0"]), settings)
+
+    assert options["workers"] == settings.WEB_CONCURRENCY >= 1
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert options["http"] in ("httptools", "h11")
+    assert options["timeout_graceful_shutdown"] == settings.SHUTDOWN_TIMEOUT
+    assert "reload" not in options
+
+    # Verify that the flag overrides the setting
+    assert server_options(parse_args(["--mode", "prod", "--workers", "3"]), settings)["workers"] == 3
+
+def test_workers_warn_without_shared_state(monkeypatch):
+    settings = get_settings("prod")
+    assert settings.WEB_CONCURRENCY == 1
+    assert shared_state_warnings(settings, 1) == []
+    assert len(shared_state_warnings(settings, 4)) == 2
+
+    shared = settings.model_copy(update={"RATE_LIMIT_URL": "redis://cache", "MESSAGE_EVENTS_URL": "redis://cache"})
+    assert shared_state_warnings(shared, 4) == []
+
+    # Without a shared cache, several workers cache nothing
+    monkeypatch.setattr(global_settings, "WEB_CONCURRENCY", 4)
+    assert create_cache_backend().max_size == 0
+
+def test_workers_start_without_shared_state(monkeypatch):
+    import uvicorn
+
+    started = {}
+    monkeypatch.setattr(uvicorn, "run", lambda app, **options: started.update(options))
+    # run() exports these for the workers
+    monkeypatch.setenv("ENV_MODE", "dev")
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    run(["--mode", "prod", "--workers", "4"])
+    assert started["workers"] == 4
+
+def test_dev_server_options():
+    options = server_options(parse_args([]), get_settings("dev"))
+    assert options["reload"] is True
+    assert "workers" not in options
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_engines_are_rebuilt_after_fork():
+    parent_engine = get_sync_engine()
+    with parent_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    pid = os.fork()
+    if pid == 0:
+        # Child: a new engine with its own connections
+        try:
+            child_engine = get_sync_engine()
+            with child_engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            os._exit(0 if child_engine is not parent_engine else 1)
+        except BaseException:
+            os._exit(2)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    # The parent's pooled connection survived the child
+    assert get_sync_engine() is parent_engine
+    with parent_engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
@@ -1,18 +1,45 @@
+import asyncio
 import pytest
 import time
-import uuid
+import tracemalloc
 from fastapi import status
 from httpx import ASGITransport, AsyncClient
 from backend.fastapi.main import app
+from backend.benchmarks.harness import ENGINES, OPERATIONS, compare_to_baseline, run_suite
+from backend.benchmarks.middleware import run_middleware_benchmark
+from backend.benchmarks.serialization import run_serialization_benchmark
+from backend.benchmarks.search import run_search_benchmark
 from backend.fastapi.core.init_settings import global_settings
+from backend.fastapi.crud import MessageService
+from backend.fastapi.dependencies.database import LazySessions, get_async_engine
 
 # Mock data for creating a message
 valid_message_data = {
     "content": "Hello, world!"
 }
 
-# Define the number of times to run the bulk insert
-Run_times = 10
+# Define the number of messages sent in a single bulk request
+Bulk_size = 1000
+
+# Define the page size and number of list requests for the JSON serialization benchmark
+List_limit = 1000
+List_requests = 20
+
+# Define the table size for the search benchmark; backend.benchmarks.search defaults to 1M rows
+Search_rows = 20000
+
+# Define the number of rows in the table for the streaming export benchmark
+Export_rows = 20000
+
+# Define the concurrency levels and requests per level for the harness smoke run
+Concurrency_levels = (1, 10, 100)
+Benchmark_requests = 50
+
+# Define the number of requests timed per middleware
+Middleware_requests = 2000
+
+# Define the number of concurrent creates for the group commit benchmark
+Group_commit_requests = 200
 
 @pytest.fixture
 def client():
@@ -20,7 +47,13 @@ def client():
     return TestClient(app)
 
 @pytest.fixture
-async def async_client():
+async def isolated_async_pool():
+    yield
+    # Benchmarks saturate the async pool, which binds its wait queue to this test's event loop
+    await get_async_engine().dispose()
+
+@pytest.fixture
+async def async_client(isolated_async_pool):
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url='http://test'
     ) as ac:
@@ -30,35 +63,108 @@ async def async_client():
 def anyio_backend():
     return 'asyncio'
 
-def test_create_message_bulk(client):
+@pytest.mark.anyio
+async def test_benchmark_harness(isolated_async_pool):
+    # A short run of the load-testing harness over every operation, engine and concurrency level
+    results = await run_suite(app, concurrency_levels=Concurrency_levels, requests=Benchmark_requests)
+    assert len(results) == len(OPERATIONS) * len(ENGINES) * len(Concurrency_levels)
+
+    for result in results:
+        assert result["errors"] == 0
+        assert result["requests"] == Benchmark_requests
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+        print("{operation}/{engine} c={concurrency}: {throughput_rps} req/s, p95 {p95} ms".format(
+            p95=result["latency_ms"]["p95"], **result
+        ))
+
+def test_benchmark_baseline_comparison():
+    baseline = [{
+        "database": "default", "operation": "get", "engine": "async", "concurrency": 10,
+        "errors": 0, "throughput_rps": 1000.0, "latency_ms": {"p95": 10.0},
+    }]
+    within_tolerance = [dict(baseline[0], throughput_rps=850.0, latency_ms={"p95": 11.0})]
+    regressed = [dict(baseline[0], throughput_rps=700.0, latency_ms={"p95": 15.0})]
+
+    assert compare_to_baseline(within_tolerance, baseline, tolerance=0.2) == []
+    assert len(compare_to_baseline(regressed, baseline, tolerance=0.2)) == 2
+
+def test_search_benchmark(tmp_path):
+    result = run_search_benchmark(f"sqlite:///{tmp_path / 'search.db'}", rows=Search_rows, queries=20)
+    print(f"Search over {Search_rows} messages: indexed p50 {result['indexed']['p50_ms']} ms, "
+          f"p95 {result['indexed']['p95_ms']} ms; unindexed scan max {result['scan']['max_ms']} ms.")
+
+    assert result["indexed"]["queries"] == 20
+    assert result["indexed"]["p50_ms"] < result["scan"]["max_ms"]
+
+def test_create_messages_bulk_endpoint(client):
+    bulk_data = [valid_message_data] * Bulk_size
     start_time = time.time()
-    for _ in range(Run_times):
-        response = client.post("/api/v1/messages/", json=valid_message_data)
-        assert response.status_code == status.HTTP_201_CREATED
-        response_data = response.json()
-        assert "id" in response_data
-        try:
-            uuid_obj = uuid.UUID(response_data["id"])
-            assert isinstance(uuid_obj, uuid.UUID)
-        except ValueError:
-            pytest.fail("Invalid UUID format returned in the response.")
-    
+    response = client.post("/api/v1/messages/bulk", json=bulk_data)
     end_time = time.time()
-    print(f"Synchronous bulk insert of {Run_times} messages took {end_time - start_time} seconds.")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.json()["ids"]) == Bulk_size
+    print(f"Synchronous bulk endpoint insert of {Bulk_size} messages took {end_time - start_time} seconds.")
 
 @pytest.mark.anyio
-async def test_create_message_async_bulk(async_client):
+async def test_create_messages_bulk_endpoint_async(async_client):
+    bulk_data = [valid_message_data] * Bulk_size
     start_time = time.time()
-    for _ in range(Run_times):
-        response = await async_client.post("/api/v1/messages/async", json=valid_message_data)
-        assert response.status_code == status.HTTP_201_CREATED
-        response_data = response.json()
-        assert "id" in response_data
-        try:
-            uuid_obj = uuid.UUID(response_data["id"])
-            assert isinstance(uuid_obj, uuid.UUID)
-        except ValueError:
-            pytest.fail("Invalid UUID format returned in the response.")
-    
+    response = await async_client.post("/api/v1/messages/bulk/async", json=bulk_data)
     end_time = time.time()
-    print(f"Asynchronous bulk insert of {Run_times} messages took {end_time - start_time} seconds.")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.json()["ids"]) == Bulk_size
+    print(f"Asynchronous bulk endpoint insert of {Bulk_size} messages took {end_time - start_time} seconds.")
+
+@pytest.mark.anyio
+async def test_serialization_benchmark(isolated_async_pool):
+    # The fast path being cheaper is checked by `python -m backend.benchmarks.serialization`, not here
+    result = await run_serialization_benchmark(app, limit=List_limit, requests=List_requests)
+    cpu_ms = result["cpu_ms_per_1000_messages"]
+    print(f"CPU time per 1000 listed messages: schema path {cpu_ms['schema']:.2f} ms, "
+          f"fast JSON path {cpu_ms['fast_json']:.2f} ms.")
+    assert result["requests"] == List_requests
+
+def test_export_memory_is_flat(client):
+    for _ in range(Export_rows // Bulk_size):
+        client.post("/api/v1/messages/bulk", json=[{"content": "x" * 100}] * Bulk_size)
+
+    # Consume the export stream directly; the test client would buffer the whole body
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    exported_bytes = sum(len(chunk) for chunk in MessageService(LazySessions()).export_messages("ndjson"))
+    elapsed = time.perf_counter() - start_time
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Exported {exported_bytes} bytes in {elapsed:.3f} seconds, peak memory {peak_bytes} bytes.")
+
+    # Only one EXPORT_BATCH_SIZE batch of rows is held at a time
+    assert peak_bytes < exported_bytes / 2
+
+@pytest.mark.anyio
+async def test_middleware_benchmark():
+    # Overhead limits are checked by `python -m backend.benchmarks.middleware`, not here
+    result = await run_middleware_benchmark(requests=Middleware_requests)
+    overhead_us = result["overhead_us"]
+    print(f"Metrics middleware overhead: {overhead_us['metrics']:.2f} microseconds per request.")
+    print(f"Session and doc-protect middleware overhead: {overhead_us['session_api']:.2f} microseconds per API request, "
+          f"{overhead_us['session_docs']:.2f} microseconds per docs request.")
+    assert result["requests"] == Middleware_requests
+
+@pytest.mark.anyio
+async def test_group_commit_vs_per_request_commit(async_client, monkeypatch):
+    async def create_concurrently():
+        start_time = time.time()
+        responses = await asyncio.gather(*(
+            async_client.post("/api/v1/messages/async", json=valid_message_data)
+            for _ in range(Group_commit_requests)
+        ))
+        assert all(response.status_code == status.HTTP_201_CREATED for response in responses)
+        return Group_commit_requests / (time.time() - start_time)
+
+    per_request_throughput = await create_concurrently()
+    monkeypatch.setattr(global_settings, "WRITE_BATCH_ENABLED", True)
+    group_commit_throughput = await create_concurrently()
+    print(f"{Group_commit_requests} concurrent creates: per-request commit {per_request_throughput:.1f} req/s, "
+          f"group commit {group_commit_throughput:.1f} req/s.")
@@ -0,0 +1,84 @@
+import gzip
+import os
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from backend.fastapi.core import static
+from backend.fastapi.core.static import IMMUTABLE, STATIC_DIR, PrecompressedStaticFiles, build_static, load_manifest
+from backend.fastapi.main import create_app
+
+def static_client(directory: str) -> TestClient:
+    static_app = FastAPI()
+    static_app.mount("/static", PrecompressedStaticFiles(directory=directory), name="static")
+    return TestClient(static_app)
+
+def test_build_static(tmp_path):
+    source, target = tmp_path / "static", tmp_path / "build"
+    source.mkdir()
+    (source / "style.css").write_text("body { margin: 0; }\n" * 100)
+    (source / "logo.png").write_bytes(os.urandom(100))
+
+    manifest = build_static(str(source), str(target))
+    assert load_manifest(str(target)) == manifest
+    hashed = manifest["style.css"]
+    assert hashed.startswith("style.") and hashed.endswith(".css") and hashed != "style.css"
+    for name in ("style.css", hashed):
+        assert gzip.decompress((target / f"{name}.gz").read_bytes()) == (source / "style.css").read_bytes()
+    # Compressed images are copied but not gzipped
+    assert (target / manifest["logo.png"]).exists()
+    assert not (target / "logo.png.gz").exists()
+
+    # A changed file gets a new hashed name; the old one stays for pages that link to it
+    (source / "style.css").write_text("body { margin: 1px; }\n" * 100)
+    assert build_static(str(source), str(target))["style.css"] != hashed
+    assert (target / hashed).exists()
+
+def test_serve_precompressed(tmp_path):
+    source, target = tmp_path / "static", tmp_path / "build"
+    source.mkdir()
+    css = "body { margin: 0; }\n" * 100
+    (source / "style.css").write_text(css)
+    hashed = build_static(str(source), str(target))["style.css"]
+    client = static_client(str(target))
+
+    response = client.get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/css")
+    assert response.headers["content-length"] == str(os.path.getsize(target / f"{hashed}.gz"))
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == css
+
+    response = client.get(f"/static/{hashed}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == css
+
+    # Unhashed names are revalidated
+    response = client.get("/static/style.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["cache-control"] == "no-cache"
+    etag = response.headers["etag"]
+    response = client.get("/static/style.css", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+@pytest.fixture
+def static_build_dir(tmp_path, monkeypatch):
+    # Builds go to a temporary directory, never into the tree
+    monkeypatch.setattr(static, "STATIC_BUILD_DIR", str(tmp_path / "build"))
+    static.static_manifest.cache_clear()
+    yield static.STATIC_BUILD_DIR
+    static.static_manifest.cache_clear()
+
+def test_pages_link_hashed_assets(static_build_dir):
+    build_static(STATIC_DIR, static_build_dir)
+    client = TestClient(create_app())
+    page = client.get("/login").text
+    stylesheet = load_manifest(static_build_dir)["style.css"]
+    assert f'href="/static/{stylesheet}"' in page
+    assert client.get(f"/static/{stylesheet}").headers["cache-control"] == IMMUTABLE
+
+def test_pages_link_source_assets_without_a_build(static_build_dir):
+    client = TestClient(create_app())
+    assert 'href="/static/style.css"' in client.get("/login").text
+    assert client.get("/static/style.css").status_code == status.HTTP_200_OK
+    assert not os.path.exists(static_build_dir)